@@ -0,0 +1,72 @@
+import json
+from datetime import datetime
+from functools import partial
+from flask import Blueprint, Response, stream_with_context
+from conditional import conditional
+from models import db, Venue, Artist, Show
+from queries import collection_validators
+from replicas import replica_router
+#----------------------------------------------------------------------------#
+# JSON API.
+#----------------------------------------------------------------------------#
+
+# Collections are exported as NDJSON (one JSON object per line), streamed
+# from a server-side cursor in batches of STREAM_BATCH_SIZE rows, so memory
+# stays flat however large the catalog is. ETag and Last-Modified come from
+# aggregates of the exported tables (see collection_validators()), so
+# clients revalidate with one query, whichever process or command wrote.
+
+api = Blueprint('api', __name__, url_prefix='/api/v1')
+
+STREAM_BATCH_SIZE = 1000
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError('%r is not JSON serializable' % value)
+
+def ndjson_response(query, serialize):
+    def generate():
+        for row in query.yield_per(STREAM_BATCH_SIZE):
+            yield json.dumps(serialize(row), default=_json_default) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@api.route('/venues')
+@replica_router.replica
+@conditional(partial(collection_validators, Venue))
+def venues():
+    query = db.session.query(
+        Venue.id, Venue.name, Venue.city, Venue.state, Venue.address,
+        Venue.phone, Venue.genres, Venue.website, Venue.facebook_link,
+        Venue.image_link, Venue.seeking_talent, Venue.seeking_description
+    ).order_by(Venue.id)
+    return ndjson_response(query, lambda row: row._asdict())
+
+@api.route('/artists')
+@replica_router.replica
+@conditional(partial(collection_validators, Artist))
+def artists():
+    query = db.session.query(
+        Artist.id, Artist.name, Artist.city, Artist.state, Artist.phone,
+        Artist.genres, Artist.website, Artist.facebook_link,
+        Artist.image_link, Artist.seeking_venue, Artist.seeking_description
+    ).order_by(Artist.id)
+    return ndjson_response(query, lambda row: row._asdict())
+
+@api.route('/shows')
+@replica_router.replica
+@conditional(partial(collection_validators, Show, Venue, Artist))
+def shows():
+    query = db.session.query(
+        Show.id,
+        Show.start_time,
+        Show.duration,
+        Show.venue_id,
+        Venue.name.label('venue_name'),
+        Show.artist_id,
+        Artist.name.label('artist_name')
+    ).join(Venue, Show.venue_id == Venue.id) \
+     .join(Artist, Show.artist_id == Artist.id) \
+     .order_by(Show.id)
+    return ndjson_response(query, lambda row: row._asdict())
@@ -2,18 +2,35 @@
 # Imports
 #----------------------------------------------------------------------------#
 
+import io
+import os
 import json
+import time
+from functools import lru_cache
+import click
 import dateutil.parser
-import babel
+import babel.dates
+from jinja2 import FileSystemBytecodeCache
 from flask import Flask, render_template, request, Response, flash, redirect, url_for, abort
 from flask_moment import Moment
 from flask_migrate import Migrate
-import logging
-import sys
-from logging import Formatter, FileHandler
 from flask_wtf import Form
+from sqlalchemy.exc import IntegrityError
 from forms import *
-from models import db, Venue, Artist, Show
+from models import db, Venue, Artist, Show, engine_options, insert_show, pool_stats, show_insert_refusal, sweep_show_counters, sweep_show_feed
+from queries import venues_by_area, artists_page, upcoming_shows_page, venue_detail, artist_detail, show_names, \
+  venue_validators, artist_validators
+from search import search_results
+from cache import response_cache
+from conditional import conditional
+from assets import build as build_assets, static_assets
+from images import image_proxy
+from seed import bulk_seed
+from api import api
+from replicas import replica_router
+from profiling import profiler
+from logs import init_logging
+from importer import BATCH_SIZE, IMPORTS, format_of, import_records
 #----------------------------------------------------------------------------#
 # App Config.
 #----------------------------------------------------------------------------#
@@ -21,38 +38,104 @@ from models import db, Venue, Artist, Show
 app = Flask(__name__)
 moment = Moment(app)
 app.config.from_object('config')
+app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(app.config))
+replica_router.init_app(app)
 db.init_app(app)
+profiler.init_app(app)
 
 # connect to a local postgresql database
 
 migrate = Migrate(app,db)
 
+app.register_blueprint(api)
+
 #----------------------------------------------------------------------------#
 # Filters.
 #----------------------------------------------------------------------------#
 
+DATETIME_FORMATS = {
+  'full': "EEEE MMMM, d, y 'at' h:mma",
+  'medium': "EE MM, dd, y h:mma"
+}
+
+@lru_cache(maxsize=4096)
+def _format_datetime(value, format, locale):
+  # a page lists the same start times on every render, so each is formatted once
+  return babel.dates.format_datetime(value, DATETIME_FORMATS.get(format, format), locale=locale)
+
 def format_datetime(value, format='medium'):
-  date = dateutil.parser.parse(value)
-  if format == 'full':
-      format="EEEE MMMM, d, y 'at' h:mma"
-  elif format == 'medium':
-      format="EE MM, dd, y h:mma"
-  return babel.dates.format_datetime(date, format)
+  # the views pass datetimes; strings are still parsed
+  if isinstance(value, str):
+    value = dateutil.parser.parse(value)
+  return _format_datetime(value, format, babel.dates.LC_TIME)
 
 app.jinja_env.filters['datetime'] = format_datetime
 
+# compiled templates are kept on disk, so new workers skip the compilation
+if app.config.get('TEMPLATE_CACHE_DIR'):
+  os.makedirs(app.config['TEMPLATE_CACHE_DIR'], exist_ok=True)
+  app.jinja_env.bytecode_cache = FileSystemBytecodeCache(app.config['TEMPLATE_CACHE_DIR'])
+
+#----------------------------------------------------------------------------#
+# Pagination.
+#----------------------------------------------------------------------------#
+
+def page_args():
+  # keyset cursor arguments of a paginated listing: ?after= or ?before=, and ?limit=
+  limit = request.args.get('limit', app.config['PAGE_SIZE'], type=int)
+  limit = max(1, min(limit, app.config['MAX_PAGE_SIZE']))
+  return {
+    "after": request.args.get('after'),
+    "before": request.args.get('before'),
+    "limit": limit
+  }
+
+def page_url(after=None, before=None):
+  # url of the current listing moved to another cursor, keeping other arguments
+  args = request.args.to_dict()
+  args.pop('after', None)
+  args.pop('before', None)
+  if after is not None:
+    args['after'] = after
+  if before is not None:
+    args['before'] = before
+  return url_for(request.endpoint, **(request.view_args or {}), **args)
+
+app.jinja_env.globals['page_url'] = page_url
+
+#----------------------------------------------------------------------------#
+# Response cache.
+#----------------------------------------------------------------------------#
+
+response_cache.init_app(app)
+
+def venue_cache_tags(venue_id):
+  # pages rendering venue_id: its own page, the listings, and the pages of
+  # the artists with shows there, plus its cached name
+  artist_ids = db.session.query(Show.artist_id).filter(Show.venue_id == venue_id).distinct()
+  return ['venues', 'shows', 'venue:%s' % venue_id, 'name:venue:%s' % venue_id] + \
+    ['artist:%s' % row.artist_id for row in artist_ids]
+
+def artist_cache_tags(artist_id):
+  # pages rendering artist_id: its own page, the listings, and the pages of
+  # the venues it plays, plus its cached name
+  venue_ids = db.session.query(Show.venue_id).filter(Show.artist_id == artist_id).distinct()
+  return ['artists', 'shows', 'artist:%s' % artist_id, 'name:artist:%s' % artist_id] + \
+    ['venue:%s' % row.venue_id for row in venue_ids]
+
+#----------------------------------------------------------------------------#
+# Static assets and images.
+#----------------------------------------------------------------------------#
+
+static_assets.init_app(app)
+image_proxy.init_app(app)
+
 #----------------------------------------------------------------------------#
 # Controllers.
 #----------------------------------------------------------------------------#
 
 @app.route('/')
 def index():
-
-  if Venue.query.count() == 0:
-    seed_venue_data()
-    seed_artist_data()
-    seed_show_data()
-
   return render_template('pages/home.html')
 
 
@@ -60,102 +143,36 @@ def index():
 #  ----------------------------------------------------------------
 
 @app.route('/venues')
+@response_cache.cached('venues')
+@replica_router.replica
 def venues():
-  # TODO: replace with real venues data.
-  data = []
-  areas = db.session.query(Venue.city,Venue.state).group_by(Venue.city,Venue.state).all()
-  for area in areas:   
-    venues_by_area = db.session.query(Venue.id,Venue.name).filter(Venue.city==area.city,Venue.state==area.state).all()
-    area_venues = []
-    for venue in venues_by_area: 
-      num_upcoming_shows = db.session.query(Show).join(Venue).filter(Show.venue_id == venue.id, Show.start_time > datetime.now()).count()
-
-      area_venues.append({
-            "id": venue.id,
-            "name": venue.name,
-            "num_upcoming_shows":num_upcoming_shows
-      })
-
-    new_area = {
-        "city": area.city,
-        "state": area.state,
-        "venues": area_venues
-    }
-    
-    data.append(new_area) 
-    
-  return render_template('pages/venues.html', areas=data)
+  try:
+    page = venues_by_area(genre=request.args.get('genre'), **page_args())
+  except ValueError:
+    abort(400, description="Invalid page cursor")
+  return render_template('pages/venues.html', areas=page.items, page=page, genre=request.args.get('genre'))
 
 @app.route('/venues/search', methods=['POST'])
+@replica_router.replica
 def search_venues():
   # TODO: implement search on artists with partial string search. Ensure it is case-insensitive.
   # seach for Hop should return "The Musical Hop".
   # search for "Music" should return "The Musical Hop" and "Park Square Live Music & Coffee" 
-  data = []
   search_term=request.form.get('search_term', '')
-  print('search_term = ', search_term)
-  search_venues = db.session.query(Venue).filter(Venue.name.ilike('%' + search_term + '%')).all()  
-  print('search_venues = ', search_venues)
-  for venue in search_venues:   
-    num_upcoming_shows = db.session.query(Show).join(Venue).filter(Show.venue_id == venue.id, Show.start_time > datetime.now()).count()
-    data.append({
-        "id": venue.id,
-        "name": venue.name,
-        "num_upcoming_shows":num_upcoming_shows
-      })
-
-  response={
-    "count": len(search_venues),
-    "data": data
-  }
+  response = search_results(Venue, search_term)
   return render_template('pages/search_venues.html', results=response, search_term=search_term)
 
 @app.route('/venues/<int:venue_id>')
+@replica_router.replica
+@conditional(venue_validators)
+@response_cache.cached('venue:{venue_id}')
 def show_venue(venue_id):
   # shows the venue page with the given venue_id
   # TODO: replace with real venue data from the venues table, using venue_id
 
-  venue_row = Venue.query.get(venue_id)
-  if venue_row is None:
+  data = venue_detail(venue_id)
+  if data is None:
     abort(404, description="Venue data not found")
-    
-  venue_shows = db.session.query(Show).join(Venue).filter(Show.venue_id == venue_id).all() 
-
-  past_shows= []
-  for show in list(filter(lambda s: s.start_time < datetime.now(), venue_shows)):
-     past_shows.append({
-      "artist_id": show.artist_id,
-      "artist_name": show.artist.name,
-      "artist_image_link": show.artist.image_link,
-      "start_time": str(show.start_time)
-      })
-
-  upcoming_shows= []
-  for show in list(filter(lambda s: s.start_time > datetime.now(), venue_shows)):
-     upcoming_shows.append({
-      "artist_id": show.artist_id,
-      "artist_name": show.artist.name,
-      "artist_image_link": show.artist.image_link,
-      "start_time": str(show.start_time)
-      }) 
-
-  data = {
-    "id": venue_row.id,
-    "name": venue_row.name,
-    "genres":venue_row.genres,
-    "address": venue_row.address,
-    "city": venue_row.city,
-    "state": venue_row.state,
-    "phone": venue_row.phone,
-    "website": venue_row.website,
-    "facebook_link":venue_row.facebook_link,
-    "seeking_talent": venue_row.seeking_talent,
-    "image_link": venue_row.image_link,
-    "past_shows": past_shows,
-    "upcoming_shows": upcoming_shows,
-    "past_shows_count": len(past_shows),
-    "upcoming_shows_count": len(upcoming_shows),
-  }
 
   return render_template('pages/show_venue.html', venue=data)
 
@@ -195,10 +212,11 @@ def create_venue_submission():
     db.session.add(new_venue_row)
     
     db.session.commit()
-  except:
+    response_cache.invalidate('venues')
+  except Exception:
     db.session.rollback()
     error = True
-    print(sys.exc_info())   
+    app.logger.exception('Could not create venue %s', request.form.get('name'))
   finally:
     db.session.close()
 
@@ -264,11 +282,13 @@ def edit_venue_submission(venue_id):
     edit_venue_row.website = request.form.get('website')
     edit_venue_row.image_link = request.form.get('image_link') 
 
+    cache_tags = venue_cache_tags(venue_id)
     db.session.commit()
-  except:
+    response_cache.invalidate(*cache_tags)
+  except Exception:
     db.session.rollback()
     error = True
-    print(sys.exc_info())    
+    app.logger.exception('Could not update venue %s', venue_id)
   finally:
     db.session.close()
 
@@ -292,12 +312,14 @@ def delete_venue(venue_id):
   delete_venue_row = Venue.query.get(venue_id)
   venue_name = delete_venue_row.name
   try:
+    cache_tags = venue_cache_tags(venue_id)
     db.session.delete(delete_venue_row)
     db.session.commit()   
-  except:
+    response_cache.invalidate(*cache_tags)
+  except Exception:
     db.session.rollback()
     error = True
-    print(sys.exc_info())    
+    app.logger.exception('Could not delete venue %s', venue_id)
   finally:
     db.session.close()
 
@@ -315,80 +337,36 @@ def delete_venue(venue_id):
 #  Artists
 #  ----------------------------------------------------------------
 @app.route('/artists')
+@response_cache.cached('artists')
+@replica_router.replica
 def artists():
-  # TODO: replace with real data returned from querying the database
-  data = Artist.query.all()
-  return render_template('pages/artists.html', artists=data)
+  try:
+    page = artists_page(genre=request.args.get('genre'), **page_args())
+  except ValueError:
+    abort(400, description="Invalid page cursor")
+  return render_template('pages/artists.html', artists=page.items, page=page, genre=request.args.get('genre'))
 
 @app.route('/artists/search', methods=['POST'])
+@replica_router.replica
 def search_artists():
   # TODO: implement search on artists with partial string search. Ensure it is case-insensitive.
   # seach for "A" should return "Guns N Petals", "Matt Quevado", and "The Wild Sax Band".
   # search for "band" should return "The Wild Sax Band".
-  data = []
   search_term=request.form.get('search_term', '')
-  print('search_term = ', search_term)
-  search_artists = db.session.query(Artist).filter(Artist.name.ilike('%' + search_term + '%')).all()  
-  print('search_artists = ', search_artists)
-  for artist in search_artists:   
-    num_upcoming_shows = db.session.query(Show).filter(Show.artist_id == artist.id, Show.start_time > datetime.now()).count()
-    data.append({
-        "id": artist.id,
-        "name": artist.name,
-        "num_upcoming_shows":num_upcoming_shows
-      })
-
-  response={
-    "count": len(search_artists),
-    "data": data
-  }
+  response = search_results(Artist, search_term)
   return render_template('pages/search_artists.html', results=response, search_term=search_term)
 
 @app.route('/artists/<int:artist_id>')
+@replica_router.replica
+@conditional(artist_validators)
+@response_cache.cached('artist:{artist_id}')
 def show_artist(artist_id):
   # shows the artist page with the given artist_id
   # TODO: replace with real artist data from the artists table, using artist_id 
 
-  artist_row = Artist.query.get(artist_id)
-  if artist_row is None:
+  data = artist_detail(artist_id)
+  if data is None:
     abort(404, description="Artist data not found")
-    
-  artist_shows = db.session.query(Show).join(Artist).filter(Show.artist_id == artist_id).all() 
-
-  past_shows= []
-  for show in list(filter(lambda s: s.start_time < datetime.now(), artist_shows)):
-     past_shows.append({
-      "venue_id": show.venue_id,
-      "venue_name": show.venue.name,
-      "venue_image_link": show.venue.image_link,
-      "start_time": str(show.start_time)
-      })
-
-  upcoming_shows= []
-  for show in list(filter(lambda s: s.start_time > datetime.now(), artist_shows)):
-     upcoming_shows.append({
-      "venue_id": show.venue_id,
-      "venue_name": show.venue.name,
-      "venue_image_link": show.venue.image_link,
-      "start_time": str(show.start_time)
-      }) 
-
-  data = {
-    "id": artist_row.id,
-    "name": artist_row.name,
-    "genres":artist_row.genres,
-    "city": artist_row.city,
-    "state": artist_row.state,
-    "phone": artist_row.phone,
-    "website": artist_row.website,
-    "facebook_link":artist_row.facebook_link,
-    "seeking_venue": artist_row.seeking_venue,
-    "image_link": artist_row.image_link,
-    "past_shows": past_shows,
-    "upcoming_shows": upcoming_shows,
-    "past_shows_count": len(past_shows),
-    "upcoming_shows_count": len(upcoming_shows),
-  }
 
   return render_template('pages/show_artist.html', artist=data)
 
@@ -428,10 +406,11 @@ def create_artist_submission():
         )    
     db.session.add(new_artist_row)    
     db.session.commit()
-  except:
+    response_cache.invalidate('artists')
+  except Exception:
     db.session.rollback()
     error = True
-    print(sys.exc_info())   
+    app.logger.exception('Could not create artist %s', request.form.get('name'))
   finally:
     db.session.close()
 
@@ -493,11 +472,13 @@ def edit_artist_submission(artist_id):
     edit_artist_row.website = request.form.get('website')
     edit_artist_row.image_link = request.form.get('image_link') 
 
+    cache_tags = artist_cache_tags(artist_id)
     db.session.commit()
-  except:
+    response_cache.invalidate(*cache_tags)
+  except Exception:
     db.session.rollback()
     error = True
-    print(sys.exc_info())    
+    app.logger.exception('Could not update artist %s', artist_id)
   finally:
     db.session.close()
 
@@ -519,12 +500,15 @@ def delete_artist(artist_id):
   delete_artist_row = Artist.query.get(artist_id)
   artist_name = delete_artist_row.name
   try:
+    # /venues also renders the upcoming show counts of the artist's venues
+    cache_tags = artist_cache_tags(artist_id) + ['venues']
     db.session.delete(delete_artist_row)
     db.session.commit()   
-  except:
+    response_cache.invalidate(*cache_tags)
+  except Exception:
     db.session.rollback()
     error = True
-    print(sys.exc_info())    
+    app.logger.exception('Could not delete artist %s', artist_id)
   finally:
     db.session.close()
 
@@ -541,25 +525,15 @@ def delete_artist(artist_id):
 #  ----------------------------------------------------------------
 
 @app.route('/shows')
+@response_cache.cached('shows')
+@replica_router.replica
 def shows():
   # displays list of shows at /shows
-  # TODO: replace with real venues data.
-  #       num_shows should be aggregated based on number of upcoming shows per venue.
-
-  data = []
-
-  upcoming_shows = db.session.query(Show).filter(Show.start_time > datetime.now()).all()  
-  for show in upcoming_shows:
-     data.append({
-      "venue_id": show.venue_id,
-      "venue_name": show.venue.name,
-      "artist_id": show.artist_id,
-      "artist_name": show.artist.name,
-      "artist_image_link": show.artist.image_link,
-      "start_time": str(show.start_time)
-      })
-
-  return render_template('pages/shows.html', shows=data)
+  try:
+    page = upcoming_shows_page(**page_args())
+  except ValueError:
+    abort(400, description="Invalid page cursor")
+  return render_template('pages/shows.html', shows=page.items, page=page)
 
 #  Create Show
 #  ----------------------------------------------------------------
@@ -573,46 +547,95 @@ def create_shows():
 @app.route('/shows/create', methods=['POST'])
 def create_show_submission():
   # called to create new shows in the db, upon submitting new show listing form
-  # TODO: insert form data as a new Show record in the db, instead
-  error = False
+  # (forms.Form is plain wtforms.Form, which does not read the request itself)
+  form = ShowForm(request.form)
+
+  if not form.validate():
+    flash( form.errors )
+    return render_template('forms/new_show.html', form=form), 400
+
+  try:
+    venue_id = int(form.venue_id.data)
+    artist_id = int(form.artist_id.data)
+  except (TypeError, ValueError):
+    flash('Venue id and Artist id must be numbers')
+    return render_template('forms/new_show.html', form=form), 400
 
-  venue_id = request.form.get('venue_id')
-  venue_row = Venue.query.get(venue_id)
-  venue_name = venue_row.name
-
-  artist_id = request.form.get('artist_id')
-  artist_row = Artist.query.get(artist_id)
-  artist_name = artist_row.name
-
-  if not(venue_row is None or artist_row is None):
-    try: 
-      # create new Show object with recived values
-      new_show_row = Show(
-          artist_id = artist_id,
-          venue_id = venue_id,        
-          start_time = request.form.get('start_time')
-          )    
-      db.session.add(new_show_row)    
-      db.session.commit()
-    except:
-      db.session.rollback()
+  error = False
+  status = None
+  try:
+    # checks both ids and overlapping bookings, and inserts, in one statement
+    status = insert_show(db.session.connection(), venue_id, artist_id,
+                         form.start_time.data, form.duration.data)
+    db.session.commit()
+  except IntegrityError as refusal:
+    # a concurrent booking of the same period won the exclusion constraint,
+    # or the venue or artist was deleted since the probe
+    db.session.rollback()
+    status = show_insert_refusal(refusal)
+    if status is None:
       error = True
-      print(sys.exc_info())   
-    finally:
-      db.session.close()
-      
-    if error:
-      # on unsuccessful db insert, flash an error instead.
-      flash('An error occurred. Show ' + artist_name + ' playing at ' + venue_name + ' at ' + request.form.get('start_time') +  ' could not be listed.')  
-    else:
-      # on successful db insert, flash success
-      flash('Show ' + artist_name + ' playing at ' + venue_name + ' at ' + request.form.get('start_time') +  ' was successfully listed!')  
+      app.logger.exception('Could not create show of artist %s at venue %s', artist_id, venue_id)
+  except Exception:
+    db.session.rollback()
+    error = True
+    app.logger.exception('Could not create show of artist %s at venue %s', artist_id, venue_id)
+  finally:
+    db.session.close()
+
+  if status == 'missing':
+    flash('Venue id or Artist id not found')
+    return render_template('forms/new_show.html', form=form), 404
+  if status == 'conflict':
+    flash('The venue or the artist already has a show booked at that time')
+    return render_template('forms/new_show.html', form=form), 409
 
+  if status == 'inserted':
+    response_cache.invalidate('shows', 'venues', 'venue:%s' % venue_id, 'artist:%s' % artist_id)
+  venue_name, artist_name = show_names(venue_id, artist_id) or ('Venue %s' % venue_id, 'Artist %s' % artist_id)
+
+  if error:
+    # on unsuccessful db insert, flash an error instead.
+    flash('An error occurred. Show ' + artist_name + ' playing at ' + venue_name + ' at ' + request.form.get('start_time') +  ' could not be listed.')  
   else:
-    flash('Venue id or Artist id not found ')  
+    # on successful db insert, flash success
+    flash('Show ' + artist_name + ' playing at ' + venue_name + ' at ' + request.form.get('start_time') +  ' was successfully listed!')  
     
   return redirect(url_for('shows'))
 
+#  Import
+#  ----------------------------------------------------------------
+
+@app.route('/import/<kind>', methods=['POST'])
+def import_upload(kind):
+  # bulk import of an uploaded CSV or NDJSON file, see importer.py
+  if kind not in IMPORTS:
+    abort(404)
+  upload = request.files.get('file')
+  if upload is None or not upload.filename:
+    abort(400, description="No file uploaded")
+  try:
+    format = request.form.get('format') or format_of(upload.filename)
+    result = import_records(kind, io.TextIOWrapper(upload.stream, encoding='utf-8'), format)
+  except ValueError as error:
+    abort(400, description=str(error))
+  return result.as_dict()
+
+#  Status
+#  ----------------------------------------------------------------
+
+@app.route('/status/pool')
+def pool_status():
+  # connection pool usage of this worker process, per database
+  return {
+    (bind or 'default'): pool_stats(engine) for bind, engine in db.engines.items()
+  }
+
+@app.route('/metrics')
+def metrics():
+  # request, SQL and render totals of this worker process, for Prometheus
+  return Response(profiler.render_metrics(), mimetype='text/plain; version=0.0.4')
+
 #  Seed inital data 
 #  ----------------------------------------------------------------
 
@@ -663,9 +686,9 @@ def seed_venue_data():
     db.session.add(venue2)
     db.session.add(venue3)
     db.session.commit()
-  except:
+  except Exception:
     db.session.rollback()
-    print(sys.exc_info())   
+    app.logger.exception('Could not seed the demo venues')
   finally:
     db.session.close()
 
@@ -690,6 +713,7 @@ def seed_artist_data():
     city= "New York",
     state= "NY",
     phone= "300-400-5000",
+    website= "https://www.mattquevedo.com",
     facebook_link= "https://www.facebook.com/mattquevedo923251523",
     seeking_venue= False,
     image_link= "https://images.unsplash.com/photo-1495223153807-b916f75de8c5?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=334&q=80"    
@@ -701,6 +725,8 @@ def seed_artist_data():
     city= "San Francisco",
     state= "CA",
     phone= "432-325-5432",
+    website= "https://www.thewildsaxband.com",
+    facebook_link= "https://www.facebook.com/TheWildSaxBand",
     seeking_venue= False,
     image_link= "https://images.unsplash.com/photo-1558369981-f9ca78462e61?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=794&q=80"
   )
@@ -710,9 +736,9 @@ def seed_artist_data():
     db.session.add(artist2)
     db.session.add(artist3)
     db.session.commit()
-  except:
+  except Exception:
     db.session.rollback()
-    print(sys.exc_info())   
+    app.logger.exception('Could not seed the demo artists')
   finally:
     db.session.close()
 
@@ -744,13 +770,99 @@ def seed_show_data():
     db.session.add(show3)
     db.session.add(show4)
     db.session.commit()
-  except:
+  except Exception:
     db.session.rollback()
-    print(sys.exc_info())   
+    app.logger.exception('Could not seed the demo shows')
   finally:
     db.session.close() 
 
 
+#  Maintenance
+#  ----------------------------------------------------------------
+
+@app.cli.command('import')
+@click.argument('kind', type=click.Choice(sorted(IMPORTS)))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', type=click.Choice(['csv', 'ndjson']), help='Defaults to the file extension.')
+@click.option('--batch-size', default=BATCH_SIZE, help='Rows inserted per transaction.')
+def import_command(kind, path, format, batch_size):
+  """Bulk import venues, artists or shows from a CSV or NDJSON file."""
+  with open(path, encoding='utf-8', newline='') as stream:
+    result = import_records(kind, stream, format or format_of(path), batch_size=batch_size)
+  for line, errors in result.rejected[:20]:
+    click.echo('line %d rejected: %s' % (line, errors), err=True)
+  click.echo('Imported %d %s in %.1fs (%.0f rows/s), rejected %d.' % (
+    result.inserted, kind, result.seconds, result.rows_per_second, len(result.rejected)))
+
+@app.cli.command('seed')
+@click.option('--venues', default=0, help='Number of synthetic venues to add.')
+@click.option('--artists', default=0, help='Number of synthetic artists to add.')
+@click.option('--shows', default=0, help='Number of synthetic shows to add.')
+@click.option('--batch-size', default=5000, help='Rows inserted per transaction.')
+@click.option('--random-seed', type=int, help='Seed making the generated data reproducible.')
+def seed_command(venues, artists, shows, batch_size, random_seed):
+  """Seed the database.
+
+  Without counts, adds the demo venues, artists and shows to an empty
+  database. With counts, bulk-inserts that many synthetic rows for load
+  testing.
+  """
+  if not (venues or artists or shows):
+    if db.session.query(Venue.id).first() is not None:
+      click.echo('Database already holds venues, not seeding the demo data.')
+      return
+    seed_venue_data()
+    seed_artist_data()
+    seed_show_data()
+    click.echo('Seeded the demo venues, artists and shows.')
+    return
+
+  started = time.perf_counter()
+  counts = bulk_seed(venues, artists, shows, batch_size=batch_size, random_seed=random_seed)
+  elapsed = time.perf_counter() - started
+  response_cache.invalidate('venues', 'artists', 'shows')
+  click.echo('Inserted %(venues)d venues, %(artists)d artists and %(shows)d shows' % counts +
+             ' in %.1fs.' % elapsed)
+
+@app.cli.command('sweep-shows')
+def sweep_shows_command():
+  """Move started shows out of the upcoming show counters and feed.
+
+  Run it periodically (e.g. every minute from cron) so that
+  Venue/Artist.upcoming_show_count, next_show_at and the
+  upcoming_show_feed table follow the clock.
+  """
+  refreshed = sweep_show_counters(db.session.connection())
+  dropped = sweep_show_feed(db.session.connection())
+  db.session.commit()
+  click.echo('Refreshed show counters of %d venues and artists, dropped %d shows from the feed.' % (refreshed, dropped))
+
+@app.cli.command('build-assets')
+def build_assets_command():
+  """Bundle, minify, compress and fingerprint the static files.
+
+  Writes static/dist and its manifest, which url_for('static') follows
+  once the app is restarted.
+  """
+  manifest = build_assets(app.static_folder)
+  click.echo('Built %d static files into %s.' % (len(manifest['files']), os.path.join(app.static_folder, 'dist')))
+  if not manifest['images']:
+    click.echo('Pillow is not installed, the responsive images were skipped.', err=True)
+
+@app.cli.command('compile-templates')
+def compile_templates_command():
+  """Compile every template into the template cache.
+
+  Run it on deploy so that no worker compiles a template on a request.
+  """
+  if app.jinja_env.bytecode_cache is None:
+    raise click.ClickException('TEMPLATE_CACHE_DIR is not set.')
+  names = app.jinja_env.list_templates()
+  for name in names:
+    app.jinja_env.get_template(name)
+  click.echo('Compiled %d templates into %s.' % (len(names), app.config['TEMPLATE_CACHE_DIR']))
+
+
 #  Error Handler
 #  ----------------------------------------------------------------
 
@@ -763,15 +875,7 @@ def server_error(error):
     return render_template('errors/500.html'), 500
 
 
-if not app.debug:
-    file_handler = FileHandler('error.log')
-    file_handler.setFormatter(
-        Formatter('%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]')
-    )
-    app.logger.setLevel(logging.INFO)
-    file_handler.setLevel(logging.INFO)
-    app.logger.addHandler(file_handler)
-    app.logger.info('errors')
+init_logging(app)
 
 #----------------------------------------------------------------------------#
 # Launch.
@@ -0,0 +1,229 @@
+import re
+from random import choice
+from asgiref.wsgi import WsgiToAsgi
+from flask import render_template, request, session
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
+from app import app, page_args
+from cache import response_cache
+from conditional import revalidate
+from replicas import pinned_to_primary
+from models import Venue, Artist
+from queries import venues_by_area, artists_page, upcoming_shows_page, venue_detail, artist_detail, \
+    venue_validators, artist_validators
+from search import search_results
+#----------------------------------------------------------------------------#
+# Async serving.
+#----------------------------------------------------------------------------#
+
+# Optional ASGI entry point, e.g. `uvicorn asgi:application`. The read pages
+# (/venues, /artists, /shows, both searches and the detail pages) are served
+# by coroutines on an async engine (asyncpg, or aiosqlite for SQLite), so a
+# worker waits on the database and on slow clients without holding a thread.
+# They reuse the query functions of queries.py and search.py through
+# AsyncSession.run_sync(), the templates and the response cache of app.py.
+# Every other request, and any read page that needs more than a cached or
+# rendered page (a 404, a bad cursor, flashed messages to show), is handed
+# to the WSGI app on asgiref's thread pool, so `python app.py` and any WSGI
+# server keep working unchanged. The detail pages answer conditional GETs
+# as app.py does (see conditional.py). The Flask request hooks (profiling,
+# access log) only run for requests served by the WSGI app.
+
+ASYNC_DRIVERS = {
+    'postgresql': 'postgresql+asyncpg',
+    'sqlite': 'sqlite+aiosqlite',
+}
+
+def async_url(uri):
+    url = make_url(uri)
+    return url.set(drivername=ASYNC_DRIVERS[url.get_backend_name()])
+
+def async_engine_options(config, url):
+    # the DB_* settings of config.py for asyncpg, see models.engine_options()
+    if url.get_backend_name() != 'postgresql':
+        return {}
+
+    connect_args = {'timeout': config['DB_CONNECT_TIMEOUT']}
+    if config['DB_PGBOUNCER']:
+        # no prepared statements, asyncpg caches them by default
+        connect_args['statement_cache_size'] = 0
+        return {'poolclass': NullPool, 'connect_args': connect_args}
+
+    if config['DB_STATEMENT_TIMEOUT']:
+        connect_args['server_settings'] = {'statement_timeout': str(config['DB_STATEMENT_TIMEOUT'])}
+    return {
+        'pool_size': config['DB_POOL_SIZE'],
+        'max_overflow': config['DB_MAX_OVERFLOW'],
+        'pool_timeout': config['DB_POOL_TIMEOUT'],
+        'pool_recycle': config['DB_POOL_RECYCLE'],
+        'pool_pre_ping': config['DB_POOL_PRE_PING'],
+        'connect_args': connect_args,
+    }
+
+def create_engine(config, uri):
+    url = async_url(uri)
+    if config['DB_PGBOUNCER'] and url.get_backend_name() == 'postgresql':
+        url = url.update_query_dict({'prepared_statement_cache_size': '0'})
+    return create_async_engine(url, **async_engine_options(config, url))
+
+class AsyncReads(object):
+
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self.wsgi = WsgiToAsgi(flask_app)
+        config = flask_app.config
+        self.engines = [create_engine(config, uri) for uri in
+                        [config['SQLALCHEMY_DATABASE_URI']] + config.get('REPLICA_DATABASE_URIS', [])]
+        self.primary, *self.replicas = [async_sessionmaker(engine, expire_on_commit=False) for engine in self.engines]
+        # (method, path pattern, handler, cache tag, validators, see conditional.py)
+        self.routes = [
+            ('GET', re.compile(r'/venues$'), self.venues, 'venues', None),
+            ('GET', re.compile(r'/artists$'), self.artists, 'artists', None),
+            ('GET', re.compile(r'/shows$'), self.shows, 'shows', None),
+            ('POST', re.compile(r'/venues/search$'), self.search_venues, None, None),
+            ('POST', re.compile(r'/artists/search$'), self.search_artists, None, None),
+            ('GET', re.compile(r'/venues/(?P<venue_id>\d+)$'), self.show_venue, 'venue:{venue_id}', venue_validators),
+            ('GET', re.compile(r'/artists/(?P<artist_id>\d+)$'), self.show_artist, 'artist:{artist_id}', artist_validators),
+        ]
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+        if scope['type'] == 'http':
+            for method, pattern, handler, tag, validators in self.routes:
+                match = pattern.match(scope['path'])
+                if match and scope['method'] == method:
+                    kwargs = {name: int(value) for name, value in match.groupdict().items()}
+                    return await self.read(scope, receive, send, handler, tag, validators, kwargs)
+        return await self.wsgi(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                for engine in self.engines:
+                    await engine.dispose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def read(self, scope, receive, send, handler, tag, validators, kwargs):
+        body = b''
+        more_body = True
+        while more_body:
+            message = await receive()
+            body += message.get('body', b'')
+            more_body = message.get('more_body', False)
+
+        headers = {name.decode('latin-1'): value.decode('latin-1') for name, value in scope['headers']}
+        with self.flask_app.test_request_context(
+            scope['path'],
+            method=scope['method'],
+            query_string=scope['query_string'].decode('latin-1'),
+            headers=headers,
+            data=body
+        ):
+            response = await self.respond(handler, tag, validators, kwargs)
+
+        if response is None:
+            return await self.wsgi(scope, self.replay(body), send)
+        status, headers, page = response
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers.items()],
+        })
+        await send({'type': 'http.response.body', 'body': page.encode('utf-8')})
+
+    async def respond(self, handler, tag, validators, kwargs):
+        # (status, headers, page) of the request, or None to leave it to the WSGI app
+        # flashed messages are shown, and cleared, by the WSGI app
+        if session.get('_flashes'):
+            return None
+
+        sessionmaker = self.sessionmaker()
+        headers = {'Content-Type': 'text/html; charset=utf-8'}
+        if validators is not None:
+            # a conditional GET is answered before the cache and the page queries
+            found = await self.query(sessionmaker, validators, **kwargs)
+            if found is None:
+                return None
+            validator_headers, fresh = revalidate(found)
+            if fresh:
+                return 304, validator_headers, ''
+            headers.update(validator_headers)
+
+        key = response_cache.key()
+        cached = tag is not None and response_cache.usable()
+        page = response_cache.get(key) if cached else None
+        if page is None:
+            page = await handler(sessionmaker, **kwargs)
+            if page is None:
+                return None
+            replica = None if sessionmaker is self.primary else sessionmaker
+            if cached and not response_cache.lagging([tag.format(**kwargs)], replica):
+                response_cache.set(key, page, tag.format(**kwargs))
+        return 200, headers, page
+
+    def sessionmaker(self):
+        # a replica, unless the visitor wrote in the last seconds (see replicas.py)
+        if self.replicas and not pinned_to_primary():
+            return choice(self.replicas)
+        return self.primary
+
+    def replay(self, body):
+        # receive() handing the WSGI app the body read already
+        async def receive():
+            return {'type': 'http.request', 'body': body, 'more_body': False}
+        return receive
+
+    async def query(self, sessionmaker, function, *args, **kwargs):
+        async with sessionmaker() as db_session:
+            return await db_session.run_sync(lambda sync_session: function(*args, session=sync_session, **kwargs))
+
+    # Handlers: the page rendered, or None to leave the request to the WSGI app.
+
+    async def venues(self, sessionmaker):
+        genre = request.args.get('genre')
+        try:
+            page = await self.query(sessionmaker, venues_by_area, genre=genre, **page_args())
+        except ValueError:
+            return None
+        return render_template('pages/venues.html', areas=page.items, page=page, genre=genre)
+
+    async def artists(self, sessionmaker):
+        genre = request.args.get('genre')
+        try:
+            page = await self.query(sessionmaker, artists_page, genre=genre, **page_args())
+        except ValueError:
+            return None
+        return render_template('pages/artists.html', artists=page.items, page=page, genre=genre)
+
+    async def shows(self, sessionmaker):
+        try:
+            page = await self.query(sessionmaker, upcoming_shows_page, **page_args())
+        except ValueError:
+            return None
+        return render_template('pages/shows.html', shows=page.items, page=page)
+
+    async def search_venues(self, sessionmaker):
+        search_term = request.form.get('search_term', '')
+        response = await self.query(sessionmaker, search_results, Venue, search_term)
+        return render_template('pages/search_venues.html', results=response, search_term=search_term)
+
+    async def search_artists(self, sessionmaker):
+        search_term = request.form.get('search_term', '')
+        response = await self.query(sessionmaker, search_results, Artist, search_term)
+        return render_template('pages/search_artists.html', results=response, search_term=search_term)
+
+    async def show_venue(self, sessionmaker, venue_id):
+        data = await self.query(sessionmaker, venue_detail, venue_id)
+        return data and render_template('pages/show_venue.html', venue=data)
+
+    async def show_artist(self, sessionmaker, artist_id):
+        data = await self.query(sessionmaker, artist_detail, artist_id)
+        return data and render_template('pages/show_artist.html', artist=data)
+
+application = AsyncReads(app)
@@ -0,0 +1,318 @@
+import gzip
+import hashlib
+import io
+import json
+import mimetypes
+import os
+import posixpath
+import re
+from flask import request, send_from_directory, url_for
+#----------------------------------------------------------------------------#
+# Static assets.
+#----------------------------------------------------------------------------#
+
+# build() writes static/dist: the BUNDLES concatenated and minified, every
+# other static file copied, all under content-hashed names, gzip and brotli
+# variants of the text files, WebP/AVIF sizes of the RESPONSIVE_IMAGES, and
+# manifest.json mapping each source name to its built name. With a manifest,
+# url_for('static', filename=...) links the built names, which never change
+# content and are served with a one year immutable Cache-Control (and their
+# precompressed variant when the client accepts it). Without one, as in
+# development, the source files are linked and served as before.
+#
+# A build writes next to the earlier ones, whose files the pages rendered
+# before a deploy (by workers not yet restarted, or kept by the response
+# cache and browsers) still link, and prunes the files only older builds
+# wrote: the last KEPT_BUILDS builds before it stay served.
+#
+# Minifying the few unminified sources uses rcssmin and rjsmin, brotli the
+# brotli package and the images Pillow (plus pillow-avif-plugin before
+# Pillow 11.2), when they are installed; otherwise those steps are skipped.
+
+DIST = 'dist'
+
+# bundle name -> source files, in page order
+BUNDLES = {
+    'css/app.css': [
+        'css/bootstrap.min.css',
+        'css/layout.main.css',
+        'css/main.css',
+        'css/main.responsive.css',
+        'css/main.quickfix.css',
+    ],
+    'js/head.js': [
+        'js/libs/modernizr-2.8.2.min.js',
+        'js/libs/moment.min.js',
+    ],
+    'js/app.js': [
+        'js/script.js',
+        'js/libs/bootstrap-3.1.1.min.js',
+        'js/plugins.js',
+    ],
+}
+
+# image -> widths of its responsive variants
+RESPONSIVE_IMAGES = {
+    'img/front-splash.jpg': (480, 960, 1440),
+}
+IMAGE_FORMATS = (('image/avif', 'AVIF', 'avif'), ('image/webp', 'WEBP', 'webp'), ('image/jpeg', 'JPEG', 'jpg'))
+IMAGE_QUALITY = {'AVIF': 50, 'WEBP': 75, 'JPEG': 80}
+
+COMPRESSED_EXTENSIONS = ('.css', '.js', '.svg', '.eot', '.ttf', '.json')
+# unreferenced once the files are renamed
+SKIPPED_EXTENSIONS = ('.map',)
+
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+KEPT_BUILDS = 1
+
+CSS_URL = re.compile(r'''url\(\s*(['"]?)([^'")]+)\1\s*\)''')
+SOURCE_MAP = re.compile(rb'^\s*//[#@] sourceMappingURL=.*$', re.MULTILINE)
+
+#----------------------------------------------------------------------------#
+# Build.
+#----------------------------------------------------------------------------#
+
+def fingerprinted(name, content):
+    # 'css/app.css' -> 'dist/css/app.<hash>.css'
+    root, extension = posixpath.splitext(name)
+    return posixpath.join(DIST, '%s.%s%s' % (root, hashlib.sha256(content).hexdigest()[:12], extension))
+
+def minify_css(content):
+    try:
+        import rcssmin
+    except ImportError:
+        return content
+    return rcssmin.cssmin(content.decode('utf-8')).encode('utf-8')
+
+def minify_js(content):
+    try:
+        import rjsmin
+    except ImportError:
+        return content
+    return rjsmin.jsmin(content.decode('utf-8')).encode('utf-8')
+
+def rewrite_css_urls(content, name, files, output):
+    # url(../fonts/x.woff) of the source `name` -> the built font, relative
+    # to the directory `output` of the built stylesheet
+    def replace(match):
+        reference = match.group(2)
+        if re.match(r'^([a-z]+:|/|#)', reference):
+            return match.group(0)
+        path, suffix = re.match(r'([^?#]*)(.*)', reference).groups()
+        target = posixpath.normpath(posixpath.join(posixpath.dirname(name), path))
+        if target not in files:
+            return match.group(0)
+        return 'url("%s%s")' % (posixpath.relpath(files[target], output), suffix)
+    return CSS_URL.sub(replace, content.decode('utf-8')).encode('utf-8')
+
+def prepare(name, content, files, output):
+    # the content served for source `name`, written to the directory `output`
+    if name.endswith('.css'):
+        if '.min.' not in name:
+            content = minify_css(content)
+        content = rewrite_css_urls(content, name, files, output)
+    elif name.endswith('.js'):
+        if '.min.' not in name:
+            content = minify_js(content)
+        content = SOURCE_MAP.sub(b'', content)
+    return content
+
+def compress(path):
+    # path.gz and path.br next to path, when smaller
+    with open(path, 'rb') as stream:
+        content = stream.read()
+    variants = [('.gz', gzip.compress(content, compresslevel=9, mtime=0))]
+    try:
+        import brotli
+    except ImportError:
+        pass
+    else:
+        variants.append(('.br', brotli.compress(content, quality=11)))
+    for suffix, compressed in variants:
+        if len(compressed) < len(content):
+            with open(path + suffix, 'wb') as stream:
+                stream.write(compressed)
+
+def responsive_images(static_folder, name, widths):
+    # Writes the variants of image `name`; returns (mime type, [(built name,
+    # width)]) per format, or None without Pillow.
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+    try:
+        import pillow_avif  # noqa: F401, registers AVIF on Pillow < 11.2
+    except ImportError:
+        pass
+
+    sources = []
+    with Image.open(os.path.join(static_folder, name)) as image:
+        image = image.convert('RGB')
+        widths = sorted({min(width, image.width) for width in widths})
+        for mimetype, format, extension in IMAGE_FORMATS:
+            if format not in Image.SAVE:
+                continue
+            variants = []
+            for width in widths:
+                resized = image.resize((width, round(image.height * width / image.width)), Image.LANCZOS)
+                stream = io.BytesIO()
+                resized.save(stream, format, quality=IMAGE_QUALITY[format], optimize=format == 'JPEG')
+                content = stream.getvalue()
+                variant = fingerprinted('%s-%d.%s' % (posixpath.splitext(name)[0], width, extension), content)
+                write(static_folder, variant, content)
+                variants.append((variant, width))
+            sources.append((mimetype, variants))
+    return sources
+
+def write(static_folder, name, content):
+    path = os.path.join(static_folder, *name.split('/'))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as stream:
+        stream.write(content)
+    if name.endswith(COMPRESSED_EXTENSIONS):
+        compress(path)
+
+def source_files(static_folder):
+    for directory, directories, filenames in os.walk(static_folder):
+        directories[:] = sorted(d for d in directories if os.path.join(directory, d) != os.path.join(static_folder, DIST))
+        for filename in sorted(filenames):
+            if filename.startswith('.') or filename.endswith(SKIPPED_EXTENSIONS):
+                continue
+            yield os.path.relpath(os.path.join(directory, filename), static_folder).replace(os.sep, '/')
+
+def prune(directory, before):
+    # removes the files under directory last written before the time before
+    for path, directories, filenames in os.walk(directory):
+        for filename in filenames:
+            filename = os.path.join(path, filename)
+            if os.path.getmtime(filename) < before:
+                os.remove(filename)
+
+def build(static_folder):
+    # Builds static_folder/dist, pruning the files of all but the last
+    # KEPT_BUILDS earlier builds; returns the manifest.
+    dist = os.path.join(static_folder, DIST)
+    os.makedirs(dist, exist_ok=True)
+    # the start, on the clock of the file times compared by prune()
+    marker = os.path.join(dist, '.build')
+    with open(marker, 'w'):
+        pass
+    started = os.path.getmtime(marker)
+    previous = os.path.join(dist, 'manifest.json')
+    builds = []
+    if os.path.exists(previous):
+        with open(previous) as stream:
+            # manifests older than the build list keep everything before them
+            builds = json.load(stream).get('builds', [0])
+    builds = [started] + builds[:KEPT_BUILDS]
+
+    def read(name):
+        with open(os.path.join(static_folder, *name.split('/')), 'rb') as stream:
+            return stream.read()
+
+    # stylesheets last, they link the built fonts and images
+    names = sorted(source_files(static_folder), key=lambda name: name.endswith('.css'))
+    files = {}
+    for name in names:
+        content = prepare(name, read(name), files, posixpath.join(DIST, posixpath.dirname(name)))
+        files[name] = fingerprinted(name, content)
+        write(static_folder, files[name], content)
+
+    for bundle, sources in BUNDLES.items():
+        # each source ends with a newline, or a semicolon when it is a script
+        separator = b';\n' if bundle.endswith('.js') else b'\n'
+        output = posixpath.join(DIST, posixpath.dirname(bundle))
+        content = separator.join(prepare(source, read(source), files, output).rstrip() for source in sources) + b'\n'
+        files[bundle] = fingerprinted(bundle, content)
+        write(static_folder, files[bundle], content)
+
+    images = {}
+    for name, widths in RESPONSIVE_IMAGES.items():
+        sources = responsive_images(static_folder, name, widths)
+        if sources:
+            images[name] = sources
+            # the largest JPEG is the fallback of <img src>
+            files[name] = sources[-1][1][-1][0]
+
+    # start times of this build and of the earlier ones kept
+    manifest = {'files': files, 'images': images, 'builds': builds}
+    write(static_folder, posixpath.join(DIST, 'manifest.json'), json.dumps(manifest, indent=2, sort_keys=True).encode())
+    prune(dist, builds[-1])
+    return manifest
+
+#----------------------------------------------------------------------------#
+# Serving.
+#----------------------------------------------------------------------------#
+
+class StaticAssets(object):
+
+    def __init__(self, app=None):
+        self.files = {}
+        self.images = {}
+        self.version = ''  # digest of the manifest, '' without one
+        self.built_at = None  # start of the build, seconds since the epoch
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.load()
+        app.url_defaults(self._fingerprint)
+        app.view_functions['static'] = self.send_static
+        app.jinja_env.globals['asset_urls'] = self.asset_urls
+        app.jinja_env.globals['image_sources'] = self.image_sources
+
+    def load(self):
+        # the manifest of the last build, if there is one
+        path = self.app.config.get('ASSETS_MANIFEST')
+        content = b'{}'
+        if path and os.path.exists(path):
+            with open(path, 'rb') as stream:
+                content = stream.read()
+        manifest = json.loads(content)
+        self.files = manifest.get('files', {})
+        self.images = manifest.get('images', {})
+        self.version = hashlib.sha256(content).hexdigest()[:12] if manifest else ''
+        self.built_at = (manifest.get('builds') or [None])[0]
+
+    def _fingerprint(self, endpoint, values):
+        if endpoint == 'static' and values.get('filename') in self.files:
+            values['filename'] = self.files[values['filename']]
+
+    def asset_urls(self, bundle):
+        # the urls to link for a bundle: the built bundle, or its sources
+        if bundle in self.files:
+            return [url_for('static', filename=bundle)]
+        return [url_for('static', filename=source) for source in BUNDLES[bundle]]
+
+    def image_sources(self, name):
+        # (mime type, srcset) of the responsive variants of an image
+        return [(mimetype, ', '.join('%s %dw' % (url_for('static', filename=variant), width)
+                                     for variant, width in variants))
+                for mimetype, variants in self.images.get(name, [])]
+
+    def send_static(self, filename):
+        if not filename.startswith(DIST + '/'):
+            return self.app.send_static_file(filename)
+
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        encoding = None
+        for candidate, suffix in (('br', '.br'), ('gzip', '.gz')):
+            if request.accept_encodings[candidate] and \
+                    os.path.isfile(os.path.join(self.app.static_folder, filename + suffix)):
+                encoding = candidate
+                filename += suffix
+                break
+
+        response = send_from_directory(self.app.static_folder, filename, mimetype=mimetype,
+                                       max_age=IMMUTABLE_MAX_AGE)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        if filename.endswith(COMPRESSED_EXTENSIONS + ('.br', '.gz')):
+            response.vary.add('Accept-Encoding')
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
+
+static_assets = StaticAssets()
@@ -0,0 +1,324 @@
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+from urllib.request import Request, urlopen
+#----------------------------------------------------------------------------#
+# Benchmark.
+#----------------------------------------------------------------------------#
+
+# Drives every read route (the listings, both searches and the detail pages)
+# against a database seeded with synthetic data, and reports per route the
+# throughput, p50/p95/p99 latency and queries per request (from the
+# X-Request-Profile header, see profiling.py). Runs in process with the
+# Flask test client, or against a running server with --url.
+#
+#   python benchmark.py --scale 100k --database postgresql://localhost/fyyur_bench
+#   python benchmark.py --scale 1k --save baseline.json
+#   python benchmark.py --scale 1k --compare baseline.json
+#   python benchmark.py --render 60
+#
+# A comparison run exits with status 1 when a route got slower (p95 or
+# throughput beyond --tolerance) or runs more queries than the baseline.
+# --render only measures what rendering a show tile costs, without a database.
+
+SCALES = {
+    # shows: (venues, artists, shows)
+    '1k': (100, 200, 1000),
+    '100k': (2000, 5000, 100000),
+    '1m': (20000, 50000, 1000000),
+}
+
+SEARCH_TERMS = ['hop', 'musical', 'san', 'jazz', 'the blue', 'club', 'band', 'rock n']
+
+RANDOM_SEED = 1
+
+def percentile(values, percent):
+    values = sorted(values)
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method='inclusive')[percent - 1]
+
+def profile_queries(header):
+    # 'queries=3; db=1.2ms; ...' -> 3
+    for part in (header or '').split(';'):
+        name, _, value = part.strip().partition('=')
+        if name == 'queries':
+            return int(value)
+    return None
+
+#----------------------------------------------------------------------------#
+# Targets.
+#----------------------------------------------------------------------------#
+
+class AppTarget(object):
+    # the app in this process, on the database given by DATABASE_URL
+
+    def __init__(self):
+        from app import app
+        self.app = app
+
+    def request(self, method, path, data=None):
+        client = self.app.test_client()
+        response = client.open(path, method=method, data=data)
+        response.get_data()
+        response.close()
+        return response.status_code, response.headers.get('X-Request-Profile')
+
+class HTTPTarget(object):
+    # a running server, e.g. gunicorn in front of the same database
+
+    def __init__(self, url):
+        self.url = url.rstrip('/')
+
+    def request(self, method, path, data=None):
+        body = urlencode(data).encode() if data else None
+        try:
+            with urlopen(Request(self.url + path, data=body, method=method), timeout=60) as response:
+                response.read()
+                return response.status, response.headers.get('X-Request-Profile')
+        except OSError as error:
+            return getattr(error, 'code', 599), None
+
+#----------------------------------------------------------------------------#
+# Data.
+#----------------------------------------------------------------------------#
+
+def prepare_database(scale, reseed=False):
+    # Creates the schema and seeds the scale's rows into an empty database;
+    # a database seeded before is reused. Returns the row counts.
+    from flask_migrate import upgrade
+    from app import app
+    from cache import response_cache
+    from models import db, Venue, Artist, Show
+    from seed import bulk_seed
+
+    venues, artists, shows = SCALES[scale]
+    with app.app_context():
+        if db.engine.dialect.name == 'postgresql':
+            upgrade()
+        else:
+            db.create_all()
+
+        if reseed:
+            for model in (Show, Venue, Artist):
+                db.session.query(model).delete()
+            db.session.commit()
+
+        if db.session.query(Show.id).first() is None:
+            print('Seeding %d venues, %d artists and %d shows...' % (venues, artists, shows), file=sys.stderr)
+            started = time.perf_counter()
+            bulk_seed(venues, artists, shows, random_seed=RANDOM_SEED)
+            print('Seeded in %.1fs.' % (time.perf_counter() - started), file=sys.stderr)
+        response_cache.invalidate('venues', 'artists', 'shows')
+
+        return {
+            'venues': db.session.query(Venue).count(),
+            'artists': db.session.query(Artist).count(),
+            'shows': db.session.query(Show).count(),
+            'dialect': db.engine.dialect.name,
+        }
+
+def detail_ids(counts, samples):
+    # ids of the detail pages to request; seeded ids are contiguous from 1
+    rng = random.Random(RANDOM_SEED)
+    return (
+        [rng.randint(1, counts['venues']) for _ in range(samples)],
+        [rng.randint(1, counts['artists']) for _ in range(samples)],
+    )
+
+def routes(counts, samples):
+    # name -> list of (method, path, form data)
+    venue_ids, artist_ids = detail_ids(counts, samples)
+    terms = [SEARCH_TERMS[number % len(SEARCH_TERMS)] for number in range(samples)]
+    return {
+        'GET /venues': [('GET', '/venues', None)] * samples,
+        'GET /artists': [('GET', '/artists', None)] * samples,
+        'GET /shows': [('GET', '/shows', None)] * samples,
+        'POST /venues/search': [('POST', '/venues/search', {'search_term': term}) for term in terms],
+        'POST /artists/search': [('POST', '/artists/search', {'search_term': term}) for term in terms],
+        'GET /venues/<id>': [('GET', '/venues/%d' % venue_id, None) for venue_id in venue_ids],
+        'GET /artists/<id>': [('GET', '/artists/%d' % artist_id, None) for artist_id in artist_ids],
+    }
+
+#----------------------------------------------------------------------------#
+# Rendering.
+#----------------------------------------------------------------------------#
+
+def render_costs(shows, rounds):
+    # Renders pages/shows.html with that many synthetic shows and returns the
+    # render time per show in microseconds (the page without shows deducted):
+    # start times passed as strings, as datetimes, and as datetimes already
+    # formatted once by the memoized datetime filter.
+    from datetime import datetime, timedelta
+    from flask import render_template
+    from app import app, _format_datetime
+    from queries import Page
+
+    first = datetime(2035, 1, 1, 20, 0)
+    items = [{
+        'venue_id': number,
+        'venue_name': 'Venue %d' % number,
+        'artist_id': number,
+        'artist_name': 'Artist %d' % number,
+        'artist_image_link': 'https://example.com/%d.jpg' % number,
+        'start_time': first + timedelta(hours=number),
+    } for number in range(shows)]
+
+    def render(items, memoized):
+        timings = []
+        for _ in range(rounds):
+            if not memoized:
+                _format_datetime.cache_clear()
+            started = time.perf_counter()
+            render_template('pages/shows.html', shows=items, page=Page(items, None, None))
+            timings.append(time.perf_counter() - started)
+        return statistics.median(timings)
+
+    with app.test_request_context('/shows'):
+        render(items, True)
+        empty = render([], True)
+        costs = {
+            'string': render([dict(item, start_time=str(item['start_time'])) for item in items], False),
+            'datetime': render(items, False),
+            'datetime, memoized': render(items, True),
+        }
+    return {name: round((seconds - empty) / shows * 1e6, 2) for name, seconds in costs.items()}
+
+#----------------------------------------------------------------------------#
+# Driver.
+#----------------------------------------------------------------------------#
+
+def run_route(target, requests, concurrency, warmup):
+    for method, path, data in requests[:warmup]:
+        target.request(method, path, data)
+
+    def timed(request):
+        started = time.perf_counter()
+        status, profile = target.request(*request)
+        return time.perf_counter() - started, status, profile_queries(profile)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(timed, requests))
+    elapsed = time.perf_counter() - started
+
+    latencies = [latency * 1000 for latency, status, queries in results]
+    queries = [queries for latency, status, queries in results if queries is not None]
+    return {
+        'requests': len(results),
+        'errors': sum(1 for latency, status, queries in results if status >= 400),
+        'throughput': round(len(results) / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 50), 2),
+        'p95_ms': round(percentile(latencies, 95), 2),
+        'p99_ms': round(percentile(latencies, 99), 2),
+        'queries_per_request': round(statistics.mean(queries), 2) if queries else None,
+    }
+
+def compare(results, baseline, tolerance):
+    # Returns the regressions of results against baseline, as messages.
+    regressions = []
+    for name, current in results['routes'].items():
+        previous = baseline['routes'].get(name)
+        if previous is None:
+            continue
+        if current['p95_ms'] > previous['p95_ms'] * (1 + tolerance):
+            regressions.append('%s: p95 %.2fms, baseline %.2fms' % (name, current['p95_ms'], previous['p95_ms']))
+        if current['throughput'] < previous['throughput'] * (1 - tolerance):
+            regressions.append('%s: %.1f req/s, baseline %.1f req/s' % (name, current['throughput'], previous['throughput']))
+        if None not in (current['queries_per_request'], previous['queries_per_request']) \
+                and current['queries_per_request'] > previous['queries_per_request']:
+            regressions.append('%s: %.2f queries per request, baseline %.2f' % (
+                name, current['queries_per_request'], previous['queries_per_request']))
+        if current['errors'] > previous['errors']:
+            regressions.append('%s: %d errors, baseline %d' % (name, current['errors'], previous['errors']))
+    return regressions
+
+def print_table(results):
+    columns = ('requests', 'errors', 'throughput', 'p50_ms', 'p95_ms', 'p99_ms', 'queries_per_request')
+    headers = ('route', 'reqs', 'errors', 'req/s', 'p50 ms', 'p95 ms', 'p99 ms', 'queries')
+    width = max(len(name) for name in results['routes'])
+    print(('%-*s' % (width, headers[0])) + ''.join('%10s' % header for header in headers[1:]))
+    for name, route in results['routes'].items():
+        print(('%-*s' % (width, name)) + ''.join('%10s' % ('-' if route[column] is None else route[column])
+                                                 for column in columns))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the Fyyur routes.')
+    parser.add_argument('--scale', choices=sorted(SCALES), default='1k', help='Number of seeded shows.')
+    parser.add_argument('--database', default='sqlite:///benchmark.db',
+                        help='Database to seed and benchmark (default: %(default)s).')
+    parser.add_argument('--url', help='Benchmark a running server instead of the app in this process.')
+    parser.add_argument('--requests', type=int, default=200, help='Requests per route.')
+    parser.add_argument('--warmup', type=int, default=20, help='Unmeasured requests per route.')
+    parser.add_argument('--concurrency', type=int, default=1, help='Concurrent requests.')
+    parser.add_argument('--cache', choices=['null', 'memory', 'redis'], default='null',
+                        help='Response cache backend of the app in this process (default: %(default)s).')
+    parser.add_argument('--reseed', action='store_true', help='Empty the database and seed it again.')
+    parser.add_argument('--save', metavar='PATH', help='Save the results as a JSON baseline.')
+    parser.add_argument('--compare', metavar='PATH', help='Compare with a JSON baseline, failing on regressions.')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='Allowed slowdown against the baseline (default: %(default)s).')
+    parser.add_argument('--render', type=int, metavar='SHOWS',
+                        help='Only measure the render cost per show of a /shows page with that many shows.')
+    args = parser.parse_args(argv)
+
+    # read by config.py, so set before the app is imported
+    os.environ['DATABASE_URL'] = args.database
+    os.environ['CACHE_BACKEND'] = args.cache
+    os.environ['PROFILE_HEADER'] = '1'
+    os.environ['LOG_REQUESTS'] = '0'
+
+    if args.render:
+        for name, microseconds in render_costs(args.render, args.requests).items():
+            print('%-20s %8.2f us per show' % (name, microseconds))
+        return 0
+
+    counts = prepare_database(args.scale, args.reseed)
+    target = HTTPTarget(args.url) if args.url else AppTarget()
+
+    results = {
+        'meta': {
+            'scale': args.scale,
+            'database': counts,
+            'target': args.url or 'in-process',
+            'cache': args.cache,
+            'concurrency': args.concurrency,
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'routes': {},
+    }
+    for name, requests in routes(counts, args.requests).items():
+        results['routes'][name] = run_route(target, requests, args.concurrency, args.warmup)
+    print_table(results)
+
+    if args.save:
+        with open(args.save, 'w') as stream:
+            json.dump(results, stream, indent=2)
+        print('Saved baseline to %s.' % args.save)
+
+    if args.compare:
+        with open(args.compare) as stream:
+            baseline = json.load(stream)
+        for setting in ('scale', 'target', 'cache', 'concurrency'):
+            if baseline['meta'].get(setting) != results['meta'][setting]:
+                print('WARNING %s is %s, the baseline ran with %s' % (
+                    setting, results['meta'][setting], baseline['meta'].get(setting)))
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print('REGRESSION ' + regression)
+        if regressions:
+            return 1
+        print('No regressions against %s.' % args.compare)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
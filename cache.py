@@ -0,0 +1,200 @@
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from urllib.parse import urlencode
+from flask import g, request, session
+from replicas import pinned_to_primary
+#----------------------------------------------------------------------------#
+# Response cache.
+#----------------------------------------------------------------------------#
+
+# Rendered pages are cached under a key built from the route and its
+# arguments, and filed under tags ('venues', 'venue:3', ...). Write handlers
+# invalidate the tags of the pages they change, which drops exactly the keys
+# filed under them. The memory backend is only invalidated in the process
+# handling the write, so it is refused with more than one worker
+# (WEB_CONCURRENCY).
+#
+# With read replicas (see replicas.py) a page is not served from the cache
+# to a visitor whose reads are pinned to the primary, and a page rendered by
+# a replica within REPLICA_STICKY_SECONDS of the invalidation of one of its
+# tags is not cached, since the replica may not have replayed the write yet.
+
+class NullCache(object):
+    def get(self, key):
+        return None
+
+    def set(self, key, value, tags=()):
+        pass
+
+    def invalidate(self, *tags):
+        pass
+
+    def recently_invalidated(self, tags):
+        return False
+
+class LRUCache(object):
+    # In-process cache holding at most maxsize entries, each for ttl seconds,
+    # and the tags invalidated in the last stamp_ttl seconds.
+
+    def __init__(self, maxsize=1024, ttl=60, stamp_ttl=5):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stamp_ttl = stamp_ttl
+        self._entries = OrderedDict()  # key -> (expires, value, tags)
+        self._tags = {}  # tag -> set of keys
+        self._stamps = {}  # tag -> time of the last invalidation
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                self._discard(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value, tags=()):
+        with self._lock:
+            self._discard(key)
+            self._entries[key] = (time.monotonic() + self.ttl, value, tags)
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.maxsize:
+                self._discard(next(iter(self._entries)))
+
+    def invalidate(self, *tags):
+        with self._lock:
+            now = time.monotonic()
+            for tag in tags:
+                self._stamps[tag] = now
+                for key in self._tags.pop(tag, ()):
+                    self._discard(key)
+            if len(self._stamps) > self.maxsize:
+                self._stamps = {tag: stamp for tag, stamp in self._stamps.items() if stamp > now - self.stamp_ttl}
+
+    def recently_invalidated(self, tags):
+        with self._lock:
+            since = time.monotonic() - self.stamp_ttl
+            return any(self._stamps.get(tag, since) > since for tag in tags)
+
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[2]:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+class RedisCache(object):
+    # Cache shared by all workers, on any Redis-compatible server. Each tag is
+    # a set of the keys filed under it.
+
+    def __init__(self, url, ttl=60, stamp_ttl=5, prefix='fyyur:'):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.stamp_ttl = stamp_ttl
+        self.prefix = prefix
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        return None if value is None else value.decode('utf-8')
+
+    def set(self, key, value, tags=()):
+        pipe = self.client.pipeline()
+        pipe.setex(self.prefix + key, self.ttl, value.encode('utf-8'))
+        for tag in tags:
+            pipe.sadd(self.prefix + 'tag:' + tag, self.prefix + key)
+            pipe.expire(self.prefix + 'tag:' + tag, self.ttl)
+        pipe.execute()
+
+    def invalidate(self, *tags):
+        for tag in tags:
+            tag_key = self.prefix + 'tag:' + tag
+            keys = self.client.smembers(tag_key)
+            self.client.delete(tag_key, *keys)
+            self.client.set(self.prefix + 'stamp:' + tag, 1, px=int(self.stamp_ttl * 1000))
+
+    def recently_invalidated(self, tags):
+        # the stamps expire after stamp_ttl seconds
+        return self.client.exists(*[self.prefix + 'stamp:' + tag for tag in tags]) > 0
+
+def cache_from_config(config):
+    backend = config.get('CACHE_BACKEND', 'memory')
+    ttl = config.get('CACHE_DEFAULT_TTL', 60)
+    stamp_ttl = config.get('REPLICA_STICKY_SECONDS', 5)
+    if backend == 'redis':
+        return RedisCache(config['CACHE_REDIS_URL'], ttl=ttl, stamp_ttl=stamp_ttl)
+    if backend == 'memory':
+        # the other workers would keep serving the pages a write invalidates
+        # until they expire
+        if config.get('WEB_CONCURRENCY', 1) > 1:
+            raise ValueError('CACHE_BACKEND memory serves a single process, use redis with %d workers'
+                             % config['WEB_CONCURRENCY'])
+        return LRUCache(maxsize=config.get('CACHE_MAX_ENTRIES', 1024), ttl=ttl, stamp_ttl=stamp_ttl)
+    return NullCache()
+
+class ResponseCache(object):
+
+    def __init__(self, app=None):
+        self.backend = NullCache()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.backend = cache_from_config(app.config)
+
+    def cached(self, *tags):
+        # Caches the page a GET view renders. tags may refer to the view
+        # arguments, e.g. 'venue:{venue_id}'.
+        def decorator(view):
+            @wraps(view)
+            def wrapper(**kwargs):
+                if not self.usable():
+                    return view(**kwargs)
+
+                key = self.key()
+                response = self.backend.get(key)
+                if response is None:
+                    response = view(**kwargs)
+                    page_tags = [tag.format(**kwargs) for tag in tags]
+                    if isinstance(response, str) and not self.lagging(page_tags, g.get('db_replica')):
+                        self.backend.set(key, response, page_tags)
+                return response
+            return wrapper
+        return decorator
+
+    def usable(self):
+        # Pages carrying flashed messages belong to one visitor only, and a
+        # visitor pinned to the primary reads past the cache, which may hold
+        # pages from before their write.
+        return request.method == 'GET' and not session.get('_flashes') and not pinned_to_primary()
+
+    def lagging(self, tags, replica):
+        # whether a page of tags rendered by replica (None for the primary)
+        # may predate the last invalidation of one of them
+        return replica is not None and self.backend.recently_invalidated(tags)
+
+    def key(self):
+        # key of the page requested: its path and sorted query arguments
+        return 'view:%s?%s' % (request.path, urlencode(sorted(request.args.items(multi=True))))
+
+    def get(self, key):
+        return self.backend.get(key)
+
+    def set(self, key, value, *tags):
+        # caches a string value other than a page, dropped with tags
+        self.backend.set(key, value, list(tags))
+
+    def invalidate(self, *tags):
+        self.backend.invalidate(*tags)
+
+response_cache = ResponseCache()
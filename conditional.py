@@ -0,0 +1,66 @@
+from datetime import datetime, timezone
+from functools import wraps
+from hashlib import sha1
+from flask import Response, current_app, make_response, request, session
+from werkzeug.http import http_date, is_resource_modified
+from assets import static_assets
+#----------------------------------------------------------------------------#
+# Conditional requests.
+#----------------------------------------------------------------------------#
+
+# Pages whose state the database can summarize cheaply (queries.py returns
+# it as PageValidators: last modified time and a version) carry an ETag and
+# a Last-Modified built from it. A browser or crawler revalidating its copy
+# with If-None-Match / If-Modified-Since gets a 304 after that one query,
+# before the response cache, the page queries and the template. Pages with
+# flashed messages belong to one visitor only and are never validated.
+#
+# The validators also cover the deployed code and assets: the ETag includes
+# DEPLOY_VERSION (or the digest of the asset manifest), and Last-Modified is
+# never older than the asset build, so a copy rendered before a deploy,
+# linking assets the next builds prune, is not revalidated after it.
+
+def deploy_version():
+    return current_app.config.get('DEPLOY_VERSION') or static_assets.version
+
+def deployed_last_modified(last_modified):
+    # last_modified (naive UTC, see queries.py), moved up to the start of
+    # the asset build
+    if static_assets.built_at is None:
+        return last_modified
+    built_at = datetime.fromtimestamp(int(static_assets.built_at), timezone.utc).replace(tzinfo=None)
+    return max(last_modified, built_at)
+
+def revalidate(validators):
+    # (headers, fresh): the validator headers of the page requested, and
+    # whether the copy the client revalidates is still current
+    etag = sha1(('%s:%s:%r' % (request.path, deploy_version(), validators.version)).encode()).hexdigest()
+    last_modified = deployed_last_modified(validators.last_modified)
+    headers = {
+        'ETag': '"%s"' % etag,
+        'Last-Modified': http_date(last_modified),
+        'Cache-Control': 'no-cache',
+    }
+    return headers, not is_resource_modified(request.environ, etag=etag, last_modified=last_modified)
+
+def conditional(validators):
+    # Answers the GETs of a view with 304 when validators(**view arguments)
+    # match the client's copy. A None from validators (no such page) leaves
+    # the request to the view.
+    def decorator(view):
+        @wraps(view)
+        def wrapper(**kwargs):
+            if request.method != 'GET' or session.get('_flashes'):
+                return view(**kwargs)
+            found = validators(**kwargs)
+            if found is None:
+                return view(**kwargs)
+
+            headers, fresh = revalidate(found)
+            if fresh:
+                return Response(status=304, headers=headers)
+            response = make_response(view(**kwargs))
+            response.headers.update(headers)
+            return response
+        return wrapper
+    return decorator
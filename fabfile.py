@@ -1,14 +1,21 @@
+import os
 from fabric.api import local, settings, abort
 from fabric.contrib.console import confirm
 
+BENCHMARK = "python benchmark.py --scale 1k --database sqlite:///benchmark.db"
+BENCHMARK_BASELINE = "benchmark_baseline.json"
+
 # prepare for deployment
 
 
 def test():
+    # benchmarks every route against the local baseline, saved by the first run
+    if os.path.exists(BENCHMARK_BASELINE):
+        command = BENCHMARK + " --compare " + BENCHMARK_BASELINE
+    else:
+        command = BENCHMARK + " --save " + BENCHMARK_BASELINE
     with settings(warn_only=True):
-        result = local(
-            "python test_tasks.py -v && python test_users.py -v", capture=True
-        )
+        result = local(command, capture=True)
     if result.failed and not confirm("Tests failed. Continue?"):
         abort("Aborted at user request.")
 
@@ -39,9 +46,7 @@ def heroku():
 
 
 def heroku_test():
-    local(
-        "heroku run python test_tasks.py -v && heroku run python test_users.py -v"
-    )
+    local("heroku run " + BENCHMARK.replace("sqlite:///", "sqlite:////tmp/"))
 
 
 def deploy():
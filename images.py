@@ -0,0 +1,233 @@
+import hashlib
+import io
+import json
+import mimetypes
+import os
+import threading
+import time
+from urllib.error import URLError
+from urllib.parse import urlsplit
+from urllib.request import HTTPRedirectHandler, Request, build_opener
+from flask import abort, request, send_file, url_for
+#----------------------------------------------------------------------------#
+# Image proxy.
+#----------------------------------------------------------------------------#
+
+# The pages link the image_link of venues and artists through
+# /images/<size>?url=..., which fetches the image once from its origin,
+# scales it down to the size (with Pillow, when installed) and keeps it in
+# IMAGE_CACHE_DIR. Images are stored under the SHA-256 of their content,
+# which is also their strong ETag, so the same picture linked from several
+# places is stored once; keys/ maps each (url, size) to its image. Every hit
+# refreshes the image's mtime, and once the cache outgrows
+# IMAGE_CACHE_MAX_BYTES the least recently used images are evicted.
+#
+# Only the hosts of IMAGE_PROXY_HOSTS are fetched, redirects included;
+# other links are left pointing at their origin.
+
+# size -> bounding box, twice the CSS size for high density screens
+IMAGE_SIZES = {
+    'tile': (480, 400),
+    'page': (1200, 1000),
+}
+
+# Pillow format -> mime type of the scaled down images
+OUTPUT_FORMATS = {'JPEG': 'image/jpeg', 'PNG': 'image/png', 'WEBP': 'image/webp', 'GIF': 'image/gif'}
+
+class ImageFetchError(Exception):
+    pass
+
+class AllowedRedirectHandler(HTTPRedirectHandler):
+    # follows redirects to allowed hosts only
+
+    def __init__(self, allowed):
+        self.allowed = allowed
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        if not self.allowed(newurl):
+            raise ImageFetchError('redirect to %s' % urlsplit(newurl).hostname)
+        return super().redirect_request(req, fp, code, msg, headers, newurl)
+
+class ImageCache(object):
+    # content-addressed files on disk, evicted least recently used first
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._size = None  # bytes stored, counted on the first write
+        self._lock = threading.Lock()
+        os.makedirs(os.path.join(directory, 'keys'), exist_ok=True)
+
+    def _object_path(self, name):
+        return os.path.join(self.directory, name[:2], name)
+
+    def _key_path(self, key):
+        return os.path.join(self.directory, 'keys', hashlib.sha256(key.encode('utf-8')).hexdigest())
+
+    def get(self, key):
+        # (path, mime type, digest) of the image filed under key, or None
+        try:
+            with open(self._key_path(key)) as stream:
+                entry = json.load(stream)
+            path = self._object_path(entry['name'])
+            os.utime(path)
+        except (OSError, ValueError, KeyError):
+            return None
+        return path, entry['mimetype'], entry['digest']
+
+    def set(self, key, content, mimetype):
+        digest = hashlib.sha256(content).hexdigest()
+        name = digest + (mimetypes.guess_extension(mimetype) or '')
+        path = self._object_path(name)
+        if not os.path.exists(path):
+            self._write(path, content)
+            with self._lock:
+                if self._size is not None:
+                    self._size += len(content)
+        self._write(self._key_path(key), json.dumps({'name': name, 'mimetype': mimetype, 'digest': digest}).encode())
+        self.evict()
+        return path, mimetype, digest
+
+    def _write(self, path, content):
+        # written aside and renamed, so other workers never read a partial file
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary = '%s.%d.%d.tmp' % (path, os.getpid(), threading.get_ident())
+        with open(temporary, 'wb') as stream:
+            stream.write(content)
+        os.replace(temporary, path)
+
+    def _objects(self):
+        for entry in os.scandir(self.directory):
+            if entry.is_dir() and entry.name != 'keys':
+                for item in os.scandir(entry.path):
+                    if not item.name.endswith('.tmp'):
+                        yield item
+
+    def evict(self):
+        with self._lock:
+            if self._size is None:
+                self._size = sum(item.stat().st_size for item in self._objects())
+            if self._size <= self.max_bytes:
+                return
+            # other workers write to the same directory, so size it again
+            objects = sorted((item.stat().st_mtime, item.stat().st_size, item.path) for item in self._objects())
+            self._size = sum(size for mtime, size, path in objects)
+            for mtime, size, path in objects:
+                if self._size <= self.max_bytes * 0.9:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                self._size -= size
+        # keys of evicted images are misses, and dropped on the next fetch
+
+def scale(content, box):
+    # content scaled down to fit box, as (content, mime type); None without
+    # Pillow or when Pillow cannot read it
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+    try:
+        with Image.open(io.BytesIO(content)) as image:
+            format = image.format if image.format in OUTPUT_FORMATS else 'JPEG'
+            if format == 'JPEG' and image.mode not in ('RGB', 'L'):
+                image = image.convert('RGB')
+            image.thumbnail(box)
+            output = io.BytesIO()
+            image.save(output, format, quality=80, optimize=True)
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return None
+    return output.getvalue(), OUTPUT_FORMATS[format]
+
+class ImageProxy(object):
+
+    def __init__(self, app=None):
+        self.hosts = set()
+        self.cache = None
+        self._fetching = {}  # key -> lock, so an image is fetched once at a time
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.hosts = set(app.config.get('IMAGE_PROXY_HOSTS', []))
+        self.timeout = app.config.get('IMAGE_PROXY_TIMEOUT', 10)
+        self.max_source_bytes = app.config.get('IMAGE_PROXY_MAX_BYTES', 10 * 1024 * 1024)
+        self.max_age = app.config.get('IMAGE_PROXY_MAX_AGE', 86400)
+        self.cache = ImageCache(app.config['IMAGE_CACHE_DIR'], app.config.get('IMAGE_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+        self.opener = build_opener(AllowedRedirectHandler(self.allowed))
+        app.add_url_rule('/images/<size>', 'image', self.serve)
+        app.jinja_env.filters['image'] = self.image_url
+
+    def allowed(self, url):
+        parts = urlsplit(url)
+        return parts.scheme in ('http', 'https') and parts.hostname in self.hosts
+
+    def image_url(self, url, size='tile'):
+        # the proxied url of an image link, or the link itself
+        if not url or not self.allowed(url):
+            return url
+        return url_for('image', size=size, url=url)
+
+    def fetch(self, url):
+        try:
+            with self.opener.open(Request(url, headers={'User-Agent': 'fyyur-image-proxy'}), timeout=self.timeout) as response:
+                mimetype = response.headers.get_content_type()
+                content = response.read(self.max_source_bytes + 1)
+        except (URLError, OSError, ValueError) as error:
+            raise ImageFetchError(str(error))
+        if not mimetype.startswith('image/'):
+            raise ImageFetchError('%s is not an image' % mimetype)
+        if len(content) > self.max_source_bytes:
+            raise ImageFetchError('larger than %d bytes' % self.max_source_bytes)
+        return content, mimetype
+
+    def store(self, key, url, size):
+        started = time.perf_counter()
+        try:
+            content, mimetype = self.fetch(url)
+        except ImageFetchError as error:
+            self.app.logger.warning('Image proxy could not fetch %s: %s', url, error)
+            abort(502, description='The image could not be fetched')
+        content, mimetype = scale(content, IMAGE_SIZES[size]) or (content, mimetype)
+        self.app.logger.info('Image proxy fetched %s in %.0fms', url, (time.perf_counter() - started) * 1000)
+        return self.cache.set(key, content, mimetype)
+
+    def serve(self, size):
+        url = request.args.get('url', '')
+        if size not in IMAGE_SIZES:
+            abort(404)
+        if not self.allowed(url):
+            abort(403, description='Images are only proxied from %s' % ', '.join(sorted(self.hosts)))
+
+        key = '%s %s' % (size, url)
+        try:
+            path, mimetype, digest = self.lookup(key, url, size)
+            response = send_file(path, mimetype=mimetype, etag=digest, max_age=self.max_age, conditional=True)
+        except FileNotFoundError:
+            # evicted by another worker since the lookup, a miss: the next
+            # lookup finds the key without its file and fetches it again
+            path, mimetype, digest = self.lookup(key, url, size)
+            response = send_file(path, mimetype=mimetype, etag=digest, max_age=self.max_age, conditional=True)
+        response.cache_control.public = True
+        return response
+
+    def lookup(self, key, url, size):
+        # (path, mime type, digest) of the image filed under key, fetched on
+        # a miss by one thread of the process at a time
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+        with self._lock:
+            lock = self._fetching.setdefault(key, threading.Lock())
+        with lock:
+            try:
+                return self.cache.get(key) or self.store(key, url, size)
+            finally:
+                with self._lock:
+                    self._fetching.pop(key, None)
+
+image_proxy = ImageProxy()
@@ -0,0 +1,270 @@
+import csv
+import io
+import json
+import time
+from datetime import datetime, timedelta
+from sqlalchemy.exc import IntegrityError
+from werkzeug.datastructures import MultiDict
+from cache import response_cache
+from forms import VenueForm, ArtistForm, ShowForm
+from models import db, Venue, Artist, Show, overlapping_shows, refresh_show_counters, refresh_show_feed
+#----------------------------------------------------------------------------#
+# Bulk import.
+#----------------------------------------------------------------------------#
+
+# Imports venues, artists or shows from CSV or NDJSON files. Records are
+# parsed one at a time, validated with the same forms as the create pages,
+# and inserted in chunks of batch_size rows, one transaction per chunk
+# (COPY on PostgreSQL, a multi-row INSERT elsewhere). Show records must
+# reference existing venues and artists, and overlap no show of their venue
+# or artist, in the table or earlier in the chunk; both are checked once per
+# chunk. A chunk the database still refuses (a booking racing the overlap
+# probe) is probed and inserted again, then rejected.
+
+BATCH_SIZE = 5000
+
+FORMATS = ('csv', 'ndjson')
+
+IMPORTS = {
+    # kind: (model, form, form fields, extra boolean and text columns)
+    'venues': (Venue, VenueForm,
+               ('name', 'city', 'state', 'address', 'phone', 'image_link', 'genres', 'facebook_link', 'website'),
+               ('seeking_talent', 'seeking_description')),
+    'artists': (Artist, ArtistForm,
+                ('name', 'city', 'state', 'phone', 'image_link', 'genres', 'facebook_link', 'website'),
+                ('seeking_venue', 'seeking_description')),
+    'shows': (Show, ShowForm, ('venue_id', 'artist_id', 'start_time', 'duration'), ()),
+}
+
+class ImportResult(object):
+
+    def __init__(self, kind):
+        self.kind = kind
+        self.inserted = 0
+        self.rejected = []  # (line number, errors)
+        self.seconds = 0.0
+
+    @property
+    def rows_per_second(self):
+        return self.inserted / self.seconds if self.seconds else 0.0
+
+    def as_dict(self):
+        return {
+            "kind": self.kind,
+            "inserted": self.inserted,
+            "rejected": len(self.rejected),
+            "errors": [{"line": line, "errors": errors} for line, errors in self.rejected[:100]],
+            "seconds": round(self.seconds, 3),
+            "rows_per_second": round(self.rows_per_second, 1),
+        }
+
+def format_of(filename):
+    if filename.endswith('.csv'):
+        return 'csv'
+    if filename.endswith(('.ndjson', '.jsonl')):
+        return 'ndjson'
+    raise ValueError('Unknown file format of %s, expected .csv or .ndjson' % filename)
+
+def read_records(stream, format):
+    # Yields (line number, record) from a text stream, one line at a time.
+    if format == 'csv':
+        reader = csv.DictReader(stream)
+        for record in reader:
+            yield reader.line_num, record
+    elif format == 'ndjson':
+        for line_number, line in enumerate(stream, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as error:
+                record = error
+            yield line_number, record
+    else:
+        raise ValueError('Unknown format %r, expected one of %s' % (format, ', '.join(FORMATS)))
+
+def _formdata(record, fields):
+    formdata = MultiDict()
+    for field in fields:
+        value = record.get(field)
+        if field == 'genres':
+            if not isinstance(value, list):
+                value = [genre.strip() for genre in (value or '').split(',')]
+            formdata.setlist(field, [genre for genre in value if genre])
+        elif field == 'start_time' and value:
+            # accept ISO 8601 (as exported by the API) besides the form format
+            try:
+                value = datetime.fromisoformat(str(value)).strftime('%Y-%m-%d %H:%M:%S')
+            except ValueError:
+                pass
+            formdata[field] = str(value)
+        elif value is not None and value != '':
+            formdata[field] = str(value)
+    return formdata
+
+def _flag(value):
+    if isinstance(value, bool):
+        return value
+    return str(value or '').strip().lower() in ('1', 'true', 't', 'yes', 'y')
+
+def _row(kind, record):
+    # Returns (row, None) for a record passing the form rules, else (None, errors).
+    if not isinstance(record, dict):
+        return None, {'record': [str(record)]}
+
+    model, form_class, fields, extras = IMPORTS[kind]
+    form = form_class(formdata=_formdata(record, fields), meta={'csrf': False})
+    if not form.validate():
+        return None, form.errors
+
+    row = {field: form.data[field] for field in fields}
+    if kind == 'shows':
+        try:
+            row['venue_id'] = int(row['venue_id'])
+            row['artist_id'] = int(row['artist_id'])
+        except (TypeError, ValueError):
+            return None, {'venue_id/artist_id': ['Expected integer ids.']}
+    else:
+        for extra in extras:
+            value = record.get(extra)
+            row[extra] = (value or None) if extra == 'seeking_description' else _flag(value)
+        row['upcoming_show_count'] = 0
+    return row, None
+
+def _copy_value(value):
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, list):
+        return '{%s}' % ','.join('"%s"' % item.replace('\\', '\\\\').replace('"', '\\"') for item in value)
+    if isinstance(value, datetime):
+        return value.isoformat(' ')
+    return value
+
+def _insert_rows(model, rows):
+    connection = db.session.connection()
+    if connection.dialect.name != 'postgresql':
+        connection.execute(model.__table__.insert(), rows)
+        return
+
+    columns = list(rows[0])
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([_copy_value(row[column]) for column in columns])
+    statement = 'COPY "%s" (%s) FROM STDIN WITH (FORMAT csv, NULL \'\\N\')' % (
+        model.__tablename__, ', '.join(columns))
+
+    cursor = connection.connection.cursor()
+    if hasattr(cursor, 'copy_expert'):
+        # psycopg2
+        buffer.seek(0)
+        cursor.copy_expert(statement, buffer)
+    else:
+        # psycopg 3
+        with cursor.copy(statement) as copy:
+            copy.write(buffer.getvalue())
+
+def _existing_ids(model, ids):
+    if not ids:
+        return set()
+    return set(db.session.scalars(db.select(model.id).where(model.id.in_(ids))))
+
+def _overlaps(period, periods):
+    return any(period[0] < end and start < period[1] for start, end in periods)
+
+def _check_shows(chunk):
+    # Splits a chunk of (line number, row) of shows into the ones to insert
+    # and the rejected (line number, errors).
+    venue_ids = _existing_ids(Venue, {row['venue_id'] for line, row in chunk})
+    artist_ids = _existing_ids(Artist, {row['artist_id'] for line, row in chunk})
+    rejected = []
+    resolved = []
+    for line, row in chunk:
+        if row['venue_id'] not in venue_ids or row['artist_id'] not in artist_ids:
+            rejected.append((line, {'venue_id/artist_id': ['Venue or artist not found.']}))
+        else:
+            resolved.append((line, row))
+
+    booked = overlapping_shows(db.session.connection(), [row for line, row in resolved])
+    accepted = []
+    periods = {}  # ('venue', id) / ('artist', id) -> [(start, end)] accepted in this chunk
+    for position, (line, row) in enumerate(resolved):
+        period = (row['start_time'], row['start_time'] + timedelta(minutes=row['duration']))
+        keys = [('venue', row['venue_id']), ('artist', row['artist_id'])]
+        if position in booked:
+            rejected.append((line, {'start_time': ['The venue or the artist already has a show at that time.']}))
+        elif any(_overlaps(period, periods.get(key, ())) for key in keys):
+            rejected.append((line, {'start_time': ['Overlaps a show of the venue or the artist earlier in the file.']}))
+        else:
+            accepted.append((line, row))
+            for key in keys:
+                periods.setdefault(key, []).append(period)
+    return accepted, rejected
+
+def _flush_chunk(kind, chunk, result, attempts=2):
+    # Inserts one chunk of (line number, row) in its own transaction.
+    model = IMPORTS[kind][0]
+    rejected = []
+    insert = chunk
+    if kind == 'shows':
+        insert, rejected = _check_shows(chunk)
+
+    rows = [row for line, row in insert]
+    try:
+        if rows:
+            _insert_rows(model, rows)
+            if kind == 'shows':
+                # COPY and multi-row INSERTs bypass the ORM flush hooks
+                refresh_show_counters(
+                    db.session.connection(),
+                    {row['venue_id'] for row in rows},
+                    {row['artist_id'] for row in rows}
+                )
+                refresh_show_feed(db.session.connection(), venue_ids={row['venue_id'] for row in rows})
+        db.session.commit()
+    except IntegrityError as error:
+        db.session.rollback()
+        if kind == 'shows' and attempts > 1:
+            # the show committed since the probe is found by the next one
+            return _flush_chunk(kind, chunk, result, attempts - 1)
+        rejected += [(line, {'database': [str(error.orig)]}) for line, row in insert]
+        rows = []
+    except Exception:
+        db.session.rollback()
+        raise
+    result.rejected.extend(sorted(rejected, key=lambda item: item[0]))
+    if not rows:
+        return
+    result.inserted += len(rows)
+
+    if kind == 'shows':
+        response_cache.invalidate('shows', 'venues',
+                                  *(['venue:%s' % row['venue_id'] for row in rows] +
+                                    ['artist:%s' % row['artist_id'] for row in rows]))
+    else:
+        response_cache.invalidate(kind)
+
+def import_records(kind, stream, format, batch_size=BATCH_SIZE):
+    # Imports records of kind ('venues', 'artists' or 'shows') from a text
+    # stream and returns an ImportResult. Chunks committed before an error
+    # stay imported.
+    if kind not in IMPORTS:
+        raise ValueError('Unknown import %r, expected one of %s' % (kind, ', '.join(IMPORTS)))
+
+    result = ImportResult(kind)
+    started = time.perf_counter()
+    chunk = []
+    for line, record in read_records(stream, format):
+        row, errors = _row(kind, record)
+        if errors:
+            result.rejected.append((line, errors))
+            continue
+        chunk.append((line, row))
+        if len(chunk) == batch_size:
+            _flush_chunk(kind, chunk, result)
+            chunk = []
+    _flush_chunk(kind, chunk, result)
+    result.seconds = time.perf_counter() - started
+    return result
@@ -0,0 +1,111 @@
+import atexit
+import copy
+import json
+import logging
+import queue
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from flask import g, has_request_context, request
+from flask.logging import default_handler
+#----------------------------------------------------------------------------#
+# Logging.
+#----------------------------------------------------------------------------#
+
+# Records are written as one JSON object per line. The request thread only
+# puts records on a queue; a QueueListener thread formats them and writes
+# them to LOG_FILE (rotated every LOG_MAX_BYTES) or to stderr, so slow disks
+# never hold up a response. Records logged during a request carry its id
+# (the X-Request-ID header, or a new one), method, path and endpoint.
+
+# attributes of every LogRecord, the others were passed in extra=
+RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime'}
+
+class JSONFormatter(logging.Formatter):
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'location': '%s:%d' % (record.pathname, record.lineno),
+        }
+        for name, value in vars(record).items():
+            if name not in RECORD_ATTRIBUTES and not name.startswith('_'):
+                entry[name] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+class RequestFilter(logging.Filter):
+    # adds the fields of the current request, on the thread serving it
+
+    def filter(self, record):
+        if has_request_context():
+            record.request_id = g.get('request_id')
+            record.method = request.method
+            record.path = request.path
+            record.endpoint = request.endpoint
+        return True
+
+class StructuredQueueHandler(QueueHandler):
+    # QueueHandler.prepare() formats the record into its message, dropping
+    # the fields the JSON formatter needs. This only renders what cannot
+    # cross threads: the message arguments and the traceback.
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+def init_logging(app):
+    # Routes app.logger through the queue; returns the started listener.
+    if app.config.get('LOG_FILE'):
+        handler = RotatingFileHandler(
+            app.config['LOG_FILE'],
+            maxBytes=app.config.get('LOG_MAX_BYTES', 10 * 1024 * 1024),
+            backupCount=app.config.get('LOG_BACKUP_COUNT', 5)
+        )
+    else:
+        handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(JSONFormatter())
+
+    records = queue.SimpleQueue()
+    queue_handler = StructuredQueueHandler(records)
+    queue_handler.addFilter(RequestFilter())
+    listener = QueueListener(records, handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+
+    app.logger.removeHandler(default_handler)
+    app.logger.addHandler(queue_handler)
+    app.logger.setLevel(app.config.get('LOG_LEVEL', 'INFO'))
+
+    @app.before_request
+    def start_request_log():
+        g.request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def log_request(response):
+        # an earlier before_request hook may have answered already
+        if 'request_id' not in g:
+            start_request_log()
+        response.headers['X-Request-ID'] = g.request_id
+        if app.config.get('LOG_REQUESTS', True):
+            app.logger.info('%s %s %s', request.method, request.path, response.status_code, extra={
+                'status': response.status_code,
+                'latency_ms': round((time.perf_counter() - g.request_started) * 1000, 2),
+            })
+        return response
+
+    return listener
@@ -27,6 +27,19 @@ config.set_main_option(
     str(current_app.extensions['migrate'].db.engine.url).replace('%', '%%'))
 target_metadata = current_app.extensions['migrate'].db.metadata
 
+# columns, indexes and tables maintained outside the models (search
+# indexes, see search.py), which autogenerate must not try to drop
+SEARCH_COLUMNS = ('search_text', 'search_vector')
+
+def include_object(object, name, type_, reflected, compare_to):
+    if type_ == 'column' and name in SEARCH_COLUMNS:
+        return False
+    if type_ == 'index' and name.endswith(tuple('_' + column for column in SEARCH_COLUMNS)):
+        return False
+    if type_ == 'table' and (name.endswith('_fts') or '_fts_' in name):
+        return False
+    return True
+
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
 # my_important_option = config.get_main_option("my_important_option")
@@ -47,7 +60,8 @@ def run_migrations_offline():
     """
     url = config.get_main_option("sqlalchemy.url")
     context.configure(
-        url=url, target_metadata=target_metadata, literal_binds=True
+        url=url, target_metadata=target_metadata, literal_binds=True,
+        include_object=include_object
     )
 
     with context.begin_transaction():
@@ -83,6 +97,7 @@ def run_migrations_online():
             connection=connection,
             target_metadata=target_metadata,
             process_revision_directives=process_revision_directives,
+            include_object=include_object,
             **current_app.extensions['migrate'].configure_args
         )
 
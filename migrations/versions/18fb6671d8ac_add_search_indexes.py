@@ -0,0 +1,76 @@
+"""add search indexes
+
+Revision ID: 18fb6671d8ac
+Revises: 2b6a7ffbe867
+Create Date: 2026-10-18 09:12:41.503218
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '18fb6671d8ac'
+down_revision = '2b6a7ffbe867'
+branch_labels = None
+depends_on = None
+
+
+SEARCH_COLUMNS = ('name', 'city', 'state', 'genres')
+
+FTS_TABLES = {
+    'Venue': 'venue_fts',
+    'Artist': 'artist_fts',
+}
+
+
+def sqlite_fts_ddl(table_name, fts_name):
+    columns = ', '.join(SEARCH_COLUMNS)
+    new_values = ', '.join('new.' + name for name in SEARCH_COLUMNS)
+    old_values = ', '.join('old.' + name for name in SEARCH_COLUMNS)
+    insert = "INSERT INTO {fts}(rowid, {columns}) VALUES (new.id, {new_values});"
+    delete = "INSERT INTO {fts}({fts}, rowid, {columns}) VALUES ('delete', old.id, {old_values});"
+    statements = [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({columns}, "
+        "content='{table}', content_rowid='id', prefix='2 3')",
+        "CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON \"{table}\" BEGIN " + insert + " END",
+        "CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON \"{table}\" BEGIN " + delete + " END",
+        "CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE ON \"{table}\" BEGIN " + delete + " " + insert + " END",
+        "INSERT INTO {fts}({fts}) VALUES ('rebuild')",
+    ]
+    return [statement.format(
+        fts=fts_name,
+        table=table_name,
+        columns=columns,
+        new_values=new_values,
+        old_values=old_values
+    ) for statement in statements]
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    for table_name, fts_name in FTS_TABLES.items():
+        if dialect == 'postgresql':
+            document = " || ' ' || ".join("coalesce(%s, '')" % name for name in SEARCH_COLUMNS)
+            op.execute(
+                'ALTER TABLE "%s" ADD COLUMN search_vector tsvector '
+                "GENERATED ALWAYS AS (to_tsvector('simple'::regconfig, %s)) STORED"
+                % (table_name, document)
+            )
+            op.create_index('ix_%s_search_vector' % table_name.lower(), table_name,
+                            ['search_vector'], postgresql_using='gin')
+        elif dialect == 'sqlite':
+            for statement in sqlite_fts_ddl(table_name, fts_name):
+                op.execute(statement)
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    for table_name, fts_name in FTS_TABLES.items():
+        if dialect == 'postgresql':
+            op.drop_index('ix_%s_search_vector' % table_name.lower(), table_name=table_name)
+            op.drop_column(table_name, 'search_vector')
+        elif dialect == 'sqlite':
+            for suffix in ('ai', 'ad', 'au'):
+                op.execute('DROP TRIGGER IF EXISTS %s_%s' % (fts_name, suffix))
+            op.execute('DROP TABLE IF EXISTS %s' % fts_name)
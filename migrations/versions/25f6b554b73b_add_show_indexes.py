@@ -0,0 +1,38 @@
+"""add show indexes
+
+Revision ID: 25f6b554b73b
+Revises: 9ea64862bb10
+Create Date: 2026-10-18 10:41:55.719304
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '25f6b554b73b'
+down_revision = '9ea64862bb10'
+branch_labels = None
+depends_on = None
+
+
+INDEXES = [
+    ('ix_show_venue_id_start_time', ['venue_id', 'start_time']),
+    ('ix_show_artist_id_start_time', ['artist_id', 'start_time']),
+    ('ix_show_start_time_id', ['start_time', 'id']),
+]
+
+
+def upgrade():
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction, and does not
+    # lock the Show table against writes while the index builds.
+    with op.get_context().autocommit_block():
+        for name, columns in INDEXES:
+            op.create_index(name, 'Show', columns, unique=False,
+                            postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, columns in INDEXES:
+            op.drop_index(name, table_name='Show', postgresql_concurrently=True)
@@ -0,0 +1,64 @@
+"""add upcoming show feed
+
+Revision ID: 30613f1f2e24
+Revises: ad33a8e5fce2
+Create Date: 2026-10-18 18:10:41.518204
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '30613f1f2e24'
+down_revision = 'ad33a8e5fce2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('upcoming_show_feed',
+    sa.Column('show_id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('start_time', sa.DateTime(), nullable=False),
+    sa.Column('venue_id', sa.Integer(), nullable=False),
+    sa.Column('venue_name', sa.String(), nullable=False),
+    sa.Column('venue_image_link', sa.String(length=500), nullable=True),
+    sa.Column('artist_id', sa.Integer(), nullable=False),
+    sa.Column('artist_name', sa.String(), nullable=False),
+    sa.Column('artist_image_link', sa.String(length=500), nullable=True),
+    sa.ForeignKeyConstraint(['show_id'], ['Show.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('show_id')
+    )
+    op.create_index('ix_upcoming_show_feed_start_time_show_id', 'upcoming_show_feed', ['start_time', 'show_id'], unique=False)
+    op.create_index('ix_upcoming_show_feed_venue_id', 'upcoming_show_feed', ['venue_id'], unique=False)
+    op.create_index('ix_upcoming_show_feed_artist_id', 'upcoming_show_feed', ['artist_id'], unique=False)
+
+    # backfill from the current shows; `flask sweep-shows` drops the started ones
+    now = datetime.now()
+    show = sa.table('Show', sa.column('id'), sa.column('venue_id'), sa.column('artist_id'), sa.column('start_time'))
+    venue = sa.table('Venue', sa.column('id'), sa.column('name'), sa.column('image_link'))
+    artist = sa.table('Artist', sa.column('id'), sa.column('name'), sa.column('image_link'))
+    feed = sa.table('upcoming_show_feed', *[sa.column(name) for name in (
+        'show_id', 'start_time', 'venue_id', 'venue_name', 'venue_image_link',
+        'artist_id', 'artist_name', 'artist_image_link')])
+    op.execute(
+        feed.insert().from_select(
+            [column.name for column in feed.c],
+            sa.select(
+                show.c.id, show.c.start_time,
+                venue.c.id, venue.c.name, venue.c.image_link,
+                artist.c.id, artist.c.name, artist.c.image_link
+            ).select_from(
+                show.join(venue, show.c.venue_id == venue.c.id).join(artist, show.c.artist_id == artist.c.id)
+            ).where(show.c.start_time > now)
+        )
+    )
+
+
+def downgrade():
+    op.drop_index('ix_upcoming_show_feed_artist_id', table_name='upcoming_show_feed')
+    op.drop_index('ix_upcoming_show_feed_venue_id', table_name='upcoming_show_feed')
+    op.drop_index('ix_upcoming_show_feed_start_time_show_id', table_name='upcoming_show_feed')
+    op.drop_table('upcoming_show_feed')
@@ -0,0 +1,100 @@
+"""use trigram search indexes
+
+Revision ID: 4c1f0d9a7e52
+Revises: b34cf26067f5
+Create Date: 2026-10-18 21:04:52.318846
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4c1f0d9a7e52'
+down_revision = 'b34cf26067f5'
+branch_labels = None
+depends_on = None
+
+
+SEARCH_COLUMNS = ('name', 'city', 'state', 'genres')
+
+FTS_TABLES = {
+    'Venue': 'venue_fts',
+    'Artist': 'artist_fts',
+}
+
+# genres_to_text() comes from 9961876dd2a7
+SEARCH_DOCUMENT = " || ' ' || ".join(
+    ["coalesce(name, '')", "coalesce(city, '')", "coalesce(state, '')", "coalesce(genres_to_text(genres), '')"]
+)
+
+
+def sqlite_fts_ddl(table_name, fts_name, options):
+    columns = ', '.join(SEARCH_COLUMNS)
+    new_values = ', '.join('new.' + name for name in SEARCH_COLUMNS)
+    old_values = ', '.join('old.' + name for name in SEARCH_COLUMNS)
+    insert = "INSERT INTO {fts}(rowid, {columns}) VALUES (new.id, {new_values});"
+    delete = "INSERT INTO {fts}({fts}, rowid, {columns}) VALUES ('delete', old.id, {old_values});"
+    statements = [
+        "CREATE VIRTUAL TABLE {fts} USING fts5({columns}, "
+        "content='{table}', content_rowid='id', {options})",
+        "CREATE TRIGGER {fts}_ai AFTER INSERT ON \"{table}\" BEGIN " + insert + " END",
+        "CREATE TRIGGER {fts}_ad AFTER DELETE ON \"{table}\" BEGIN " + delete + " END",
+        "CREATE TRIGGER {fts}_au AFTER UPDATE ON \"{table}\" BEGIN " + delete + " " + insert + " END",
+        "INSERT INTO {fts}({fts}) VALUES ('rebuild')",
+    ]
+    return [statement.format(
+        fts=fts_name,
+        table=table_name,
+        columns=columns,
+        options=options,
+        new_values=new_values,
+        old_values=old_values
+    ) for statement in statements]
+
+
+def drop_sqlite_fts(fts_name):
+    for suffix in ('ai', 'ad', 'au'):
+        op.execute('DROP TRIGGER IF EXISTS %s_%s' % (fts_name, suffix))
+    op.execute('DROP TABLE IF EXISTS %s' % fts_name)
+
+
+def upgrade():
+    # word prefix matching (tsvector, FTS5 prefixes) becomes substring
+    # matching (pg_trgm, the FTS5 trigram tokenizer)
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for table_name, fts_name in FTS_TABLES.items():
+        if dialect == 'postgresql':
+            op.drop_index('ix_%s_search_vector' % table_name.lower(), table_name=table_name)
+            op.drop_column(table_name, 'search_vector')
+            op.execute(
+                'ALTER TABLE "%s" ADD COLUMN search_text text GENERATED ALWAYS AS (%s) STORED'
+                % (table_name, SEARCH_DOCUMENT)
+            )
+            op.create_index('ix_%s_search_text' % table_name.lower(), table_name, ['search_text'],
+                            postgresql_using='gin', postgresql_ops={'search_text': 'gin_trgm_ops'})
+        elif dialect == 'sqlite':
+            drop_sqlite_fts(fts_name)
+            for statement in sqlite_fts_ddl(table_name, fts_name, "tokenize='trigram'"):
+                op.execute(statement)
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    for table_name, fts_name in FTS_TABLES.items():
+        if dialect == 'postgresql':
+            op.drop_index('ix_%s_search_text' % table_name.lower(), table_name=table_name)
+            op.drop_column(table_name, 'search_text')
+            op.execute(
+                'ALTER TABLE "%s" ADD COLUMN search_vector tsvector '
+                "GENERATED ALWAYS AS (to_tsvector('simple'::regconfig, %s)) STORED"
+                % (table_name, SEARCH_DOCUMENT)
+            )
+            op.create_index('ix_%s_search_vector' % table_name.lower(), table_name,
+                            ['search_vector'], postgresql_using='gin')
+        elif dialect == 'sqlite':
+            drop_sqlite_fts(fts_name)
+            for statement in sqlite_fts_ddl(table_name, fts_name, "prefix='2 3'"):
+                op.execute(statement)
@@ -0,0 +1,46 @@
+"""store updated_at in utc
+
+Revision ID: 7e3a9c5d2b81
+Revises: 4c1f0d9a7e52
+Create Date: 2026-10-19 10:12:44.081235
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7e3a9c5d2b81'
+down_revision = '4c1f0d9a7e52'
+branch_labels = None
+depends_on = None
+
+
+TABLES = ['Venue', 'Artist', 'Show']
+
+# SQLite stamps CURRENT_TIMESTAMP in UTC already; on PostgreSQL now() follows
+# the session TimeZone, so the stamps written so far are moved from it to UTC
+
+
+def upgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    for table_name in TABLES:
+        op.execute(
+            "UPDATE \"%s\" SET updated_at = timezone('utc', timezone(current_setting('TimeZone'), updated_at))"
+            % table_name
+        )
+        op.alter_column(table_name, 'updated_at', existing_type=sa.DateTime(), existing_nullable=False,
+                        server_default=sa.text("timezone('utc', now())"))
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    for table_name in TABLES:
+        op.alter_column(table_name, 'updated_at', existing_type=sa.DateTime(), existing_nullable=False,
+                        server_default=sa.func.now())
+        op.execute(
+            "UPDATE \"%s\" SET updated_at = timezone(current_setting('TimeZone'), timezone('utc', updated_at))"
+            % table_name
+        )
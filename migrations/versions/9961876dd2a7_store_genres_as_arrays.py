@@ -0,0 +1,92 @@
+"""store genres as arrays
+
+Revision ID: 9961876dd2a7
+Revises: 25f6b554b73b
+Create Date: 2026-10-18 11:23:08.914562
+
+"""
+from contextlib import contextmanager
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '9961876dd2a7'
+down_revision = '25f6b554b73b'
+branch_labels = None
+depends_on = None
+
+
+TABLES = ['Venue', 'Artist']
+
+
+def search_document(genres):
+    return " || ' ' || ".join(
+        ["coalesce(name, '')", "coalesce(city, '')", "coalesce(state, '')", "coalesce(%s, '')" % genres]
+    )
+
+
+@contextmanager
+def rebuilt_search_vector(table_name, genres):
+    # the generated search_vector column depends on genres, so it is rebuilt
+    # around the type change
+    op.drop_index('ix_%s_search_vector' % table_name.lower(), table_name=table_name)
+    op.drop_column(table_name, 'search_vector')
+    yield
+    op.execute(
+        'ALTER TABLE "%s" ADD COLUMN search_vector tsvector '
+        "GENERATED ALWAYS AS (to_tsvector('simple'::regconfig, %s)) STORED"
+        % (table_name, search_document(genres))
+    )
+    op.create_index('ix_%s_search_vector' % table_name.lower(), table_name,
+                    ['search_vector'], postgresql_using='gin')
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        # array_to_string() is only STABLE, generated columns need IMMUTABLE
+        op.execute(
+            'CREATE FUNCTION genres_to_text(varchar[]) RETURNS text '
+            "LANGUAGE sql IMMUTABLE AS $$ SELECT array_to_string($1, ' ') $$"
+        )
+        for table_name in TABLES:
+            with rebuilt_search_vector(table_name, 'genres_to_text(genres)'):
+                # rows written through the old String column hold a '{Jazz,Folk}'
+                # array literal; anything else becomes a one-element array
+                op.alter_column(
+                    table_name, 'genres',
+                    existing_type=sa.VARCHAR(length=120),
+                    type_=postgresql.ARRAY(sa.String(length=120)),
+                    existing_nullable=False,
+                    postgresql_using="CASE WHEN genres LIKE '{%}' THEN genres::varchar(120)[] "
+                                     "ELSE ARRAY[genres]::varchar(120)[] END"
+                )
+            op.create_index('ix_%s_genres' % table_name.lower(), table_name,
+                            ['genres'], postgresql_using='gin')
+    elif dialect == 'sqlite':
+        # genres become JSON arrays; the column keeps its TEXT affinity
+        for table_name in TABLES:
+            op.execute(
+                'UPDATE "%s" SET genres = json_array(genres) '
+                "WHERE CASE WHEN json_valid(genres) THEN json_type(genres) != 'array' ELSE 1 END"
+                % table_name
+            )
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        for table_name in TABLES:
+            op.drop_index('ix_%s_genres' % table_name.lower(), table_name=table_name)
+            with rebuilt_search_vector(table_name, 'genres'):
+                op.alter_column(
+                    table_name, 'genres',
+                    existing_type=postgresql.ARRAY(sa.String(length=120)),
+                    type_=sa.VARCHAR(length=120),
+                    existing_nullable=False,
+                    postgresql_using='genres::varchar(120)'
+                )
+        op.execute('DROP FUNCTION genres_to_text(varchar[])')
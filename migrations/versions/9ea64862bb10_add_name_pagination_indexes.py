@@ -0,0 +1,26 @@
+"""add name pagination indexes
+
+Revision ID: 9ea64862bb10
+Revises: 18fb6671d8ac
+Create Date: 2026-10-18 10:04:17.286530
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9ea64862bb10'
+down_revision = '18fb6671d8ac'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_venue_name_id', 'Venue', ['name', 'id'], unique=False)
+    op.create_index('ix_artist_name_id', 'Artist', ['name', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_artist_name_id', table_name='Artist')
+    op.drop_index('ix_venue_name_id', table_name='Venue')
@@ -0,0 +1,53 @@
+"""add show duration and overlap constraints
+
+Revision ID: ad33a8e5fce2
+Revises: c70279cd6789
+Create Date: 2026-10-18 13:14:52.206337
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'ad33a8e5fce2'
+down_revision = 'c70279cd6789'
+branch_labels = None
+depends_on = None
+
+
+SHOW_PERIOD = "tsrange(start_time, start_time + duration * interval '1 minute')"
+
+CONSTRAINTS = [
+    ('ex_show_venue_period', 'venue_id'),
+    ('ex_show_artist_period', 'artist_id'),
+]
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    with op.batch_alter_table('Show') as batch_op:
+        batch_op.add_column(sa.Column('duration', sa.Integer(), server_default='120', nullable=False))
+        batch_op.create_check_constraint('ck_show_duration', 'duration BETWEEN 1 AND 1440')
+
+    if dialect == 'postgresql':
+        # start_time is a timestamp without time zone, so the periods are
+        # tsranges; timestamp + interval is IMMUTABLE, as index expressions
+        # need. Fails if existing shows already overlap.
+        op.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+        for name, foreign_key in CONSTRAINTS:
+            op.execute(
+                'ALTER TABLE "Show" ADD CONSTRAINT %s EXCLUDE USING gist (%s WITH =, %s WITH &&)'
+                % (name, foreign_key, SHOW_PERIOD)
+            )
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        for name, foreign_key in CONSTRAINTS:
+            op.execute('ALTER TABLE "Show" DROP CONSTRAINT %s' % name)
+
+    with op.batch_alter_table('Show') as batch_op:
+        batch_op.drop_constraint('ck_show_duration', type_='check')
+        batch_op.drop_column('duration')
@@ -0,0 +1,80 @@
+"""add updated_at columns
+
+Revision ID: b34cf26067f5
+Revises: 30613f1f2e24
+Create Date: 2026-10-18 18:31:07.904512
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b34cf26067f5'
+down_revision = '30613f1f2e24'
+branch_labels = None
+depends_on = None
+
+
+TABLES = ['Venue', 'Artist', 'Show']
+
+SEARCH_COLUMNS = ('name', 'city', 'state', 'genres')
+
+FTS_TABLES = {
+    'Venue': 'venue_fts',
+    'Artist': 'artist_fts',
+}
+
+
+def restore_sqlite_fts(table_name):
+    # SQLite drops the triggers of a table rebuilt by batch_alter_table, so
+    # the ones 18fb6671d8ac created to keep the FTS5 index in sync are
+    # created again, and the index rebuilt
+    fts_name = FTS_TABLES.get(table_name)
+    if fts_name is None:
+        return
+    columns = ', '.join(SEARCH_COLUMNS)
+    new_values = ', '.join('new.' + name for name in SEARCH_COLUMNS)
+    old_values = ', '.join('old.' + name for name in SEARCH_COLUMNS)
+    insert = "INSERT INTO {fts}(rowid, {columns}) VALUES (new.id, {new_values});"
+    delete = "INSERT INTO {fts}({fts}, rowid, {columns}) VALUES ('delete', old.id, {old_values});"
+    statements = [
+        "CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON \"{table}\" BEGIN " + insert + " END",
+        "CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON \"{table}\" BEGIN " + delete + " END",
+        "CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE ON \"{table}\" BEGIN " + delete + " " + insert + " END",
+        "INSERT INTO {fts}({fts}) VALUES ('rebuild')",
+    ]
+    for statement in statements:
+        op.execute(statement.format(
+            fts=fts_name,
+            table=table_name,
+            columns=columns,
+            new_values=new_values,
+            old_values=old_values
+        ))
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    for table_name in TABLES:
+        if dialect == 'postgresql':
+            # now() is evaluated once, so existing rows are not rewritten
+            op.add_column(table_name, sa.Column('updated_at', sa.DateTime(), server_default=sa.func.now(), nullable=False))
+            continue
+
+        # SQLite cannot add a column with a non-constant default
+        op.add_column(table_name, sa.Column('updated_at', sa.DateTime(), nullable=True))
+        op.execute(sa.table(table_name, sa.column('updated_at')).update().values(updated_at=sa.func.now()))
+        with op.batch_alter_table(table_name) as batch_op:
+            batch_op.alter_column('updated_at', existing_type=sa.DateTime(), nullable=False,
+                                  server_default=sa.func.now())
+        restore_sqlite_fts(table_name)
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    for table_name in TABLES:
+        with op.batch_alter_table(table_name) as batch_op:
+            batch_op.drop_column('updated_at')
+        if dialect == 'sqlite':
+            restore_sqlite_fts(table_name)
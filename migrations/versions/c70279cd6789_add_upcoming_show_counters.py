@@ -0,0 +1,48 @@
+"""add upcoming show counters
+
+Revision ID: c70279cd6789
+Revises: 9961876dd2a7
+Create Date: 2026-10-18 12:02:37.640911
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c70279cd6789'
+down_revision = '9961876dd2a7'
+branch_labels = None
+depends_on = None
+
+
+TABLES = [('Venue', 'venue_id'), ('Artist', 'artist_id')]
+
+
+def upgrade():
+    for table_name, foreign_key in TABLES:
+        op.add_column(table_name, sa.Column('upcoming_show_count', sa.Integer(), server_default='0', nullable=False))
+        op.add_column(table_name, sa.Column('next_show_at', sa.DateTime(), nullable=True))
+        op.create_index('ix_%s_next_show_at' % table_name.lower(), table_name, ['next_show_at'], unique=False)
+
+    # backfill from the current shows; `flask sweep-shows` keeps them current
+    now = datetime.now()
+    show = sa.table('Show', sa.column('id'), sa.column('venue_id'), sa.column('artist_id'), sa.column('start_time'))
+    for table_name, foreign_key in TABLES:
+        table = sa.table(table_name, sa.column('id'), sa.column('upcoming_show_count'), sa.column('next_show_at'))
+        upcoming = (show.c[foreign_key] == table.c.id) & (show.c.start_time > now)
+        op.execute(
+            table.update().values(
+                upcoming_show_count=sa.select(sa.func.count(show.c.id)).where(upcoming).scalar_subquery(),
+                next_show_at=sa.select(sa.func.min(show.c.start_time)).where(upcoming).scalar_subquery()
+            )
+        )
+
+
+def downgrade():
+    for table_name, foreign_key in TABLES:
+        op.drop_index('ix_%s_next_show_at' % table_name.lower(), table_name=table_name)
+        op.drop_column(table_name, 'next_show_at')
+        op.drop_column(table_name, 'upcoming_show_count')
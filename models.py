@@ -1,11 +1,108 @@
+from datetime import datetime, timedelta
+from flask import g, has_app_context
 from flask_sqlalchemy import SQLAlchemy
-db = SQLAlchemy()
+from flask_sqlalchemy.session import Session as BindSession
+from sqlalchemy import DDL, event, inspect
+from sqlalchemy.dialects.postgresql import ARRAY, ExcludeConstraint
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.functions import FunctionElement
+from sqlalchemy.pool import NullPool
+
+class RoutingSession(BindSession):
+    # Runs the queries of a read-only view on the replica bind picked for
+    # the request (g.db_replica, set by replicas.ReplicaRouter), and
+    # everything else, flushes included, on the primary.
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and has_app_context():
+            replica = g.get('db_replica')
+            if replica is not None:
+                return self._db.engines[replica]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+#----------------------------------------------------------------------------#
+# Engine.
+#----------------------------------------------------------------------------#
+
+def engine_options(config, url=None):
+    # SQLALCHEMY_ENGINE_OPTIONS built from the DB_* settings of config.py,
+    # for the database at url (SQLALCHEMY_DATABASE_URI by default). Only
+    # PostgreSQL engines are tuned; SQLite keeps the Flask-SQLAlchemy defaults.
+    url = make_url(url or config['SQLALCHEMY_DATABASE_URI'])
+    if url.get_backend_name() != 'postgresql':
+        return {}
+
+    connect_args = {'connect_timeout': config['DB_CONNECT_TIMEOUT']}
+    if config['DB_PGBOUNCER']:
+        # PgBouncer owns the pool; transactions may land on any server
+        # connection, so nothing may rely on session state
+        if url.get_driver_name() == 'psycopg':
+            connect_args['prepare_threshold'] = None
+        return {'poolclass': NullPool, 'connect_args': connect_args}
+
+    if config['DB_STATEMENT_TIMEOUT']:
+        connect_args['options'] = '-c statement_timeout=%d' % config['DB_STATEMENT_TIMEOUT']
+    return {
+        'pool_size': config['DB_POOL_SIZE'],
+        'max_overflow': config['DB_MAX_OVERFLOW'],
+        'pool_timeout': config['DB_POOL_TIMEOUT'],
+        'pool_recycle': config['DB_POOL_RECYCLE'],
+        'pool_pre_ping': config['DB_POOL_PRE_PING'],
+        'connect_args': connect_args,
+    }
+
+def pool_stats(engine):
+    # connections of engine's pool; NullPool keeps none
+    pool = engine.pool
+    stats = {'pool': type(pool).__name__, 'status': pool.status()}
+    for name in ('size', 'checkedin', 'checkedout', 'overflow'):
+        if hasattr(pool, name):
+            stats[name] = getattr(pool, name)()
+    return stats
+
+# genres are a native array on PostgreSQL (GIN indexed for genre filters)
+# and a JSON array on SQLite
+Genres = ARRAY(db.String(120)).with_variant(db.JSON(), 'sqlite')
+
+class utc_now(FunctionElement):
+    # the database clock in UTC, without a time zone: CURRENT_TIMESTAMP is
+    # UTC on SQLite, now() follows the session TimeZone on PostgreSQL
+    type = db.DateTime()
+    inherit_cache = True
+
+@compiles(utc_now)
+def _compile_utc_now(element, compiler, **kwargs):
+    return 'CURRENT_TIMESTAMP'
+
+@compiles(utc_now, 'postgresql')
+def _compile_utc_now_postgresql(element, compiler, **kwargs):
+    return "timezone('utc', now())"
+
+# show durations, in minutes. MAX_SHOW_MINUTES bounds how far back the
+# overlap probe of insert_show() has to scan the start_time indexes.
+DEFAULT_SHOW_MINUTES = 120
+MAX_SHOW_MINUTES = 24 * 60
+
+# the period booked by a show, [start_time, start_time + duration)
+SHOW_PERIOD = "tsrange(start_time, start_time + duration * interval '1 minute')"
+
 #----------------------------------------------------------------------------#
 # Models.
 #----------------------------------------------------------------------------#
 
 class Venue(db.Model):
     __tablename__ = 'Venue'
+    __table_args__ = (
+        # keyset pagination of /venues
+        db.Index('ix_venue_name_id', 'name', 'id'),
+        db.Index('ix_venue_genres', 'genres', postgresql_using='gin').ddl_if(dialect='postgresql'),
+        # sweep of venues whose next show has started
+        db.Index('ix_venue_next_show_at', 'next_show_at'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String, nullable=False)
@@ -17,22 +114,36 @@ class Venue(db.Model):
     facebook_link = db.Column(db.String(120), nullable=False)
 
     # TODO: implement any missing fields, as a database migration using Flask-Migrate  
-    genres = db.Column(db.String(120), nullable=False)
+    genres = db.Column(Genres, nullable=False)
     website = db.Column(db.String(120), nullable=False)
 
     seeking_talent = db.Column(db.Boolean,default=False)
     seeking_description = db.Column(db.String(500))   
+
+    # denormalized from Show, see refresh_show_counters()
+    upcoming_show_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    next_show_at = db.Column(db.DateTime)
+    # validator of the conditional GETs of the detail pages, set by the database clock in UTC
+    updated_at = db.Column(db.DateTime, nullable=False, default=utc_now(), onupdate=utc_now(),
+                           server_default=utc_now())
     shows = db.relationship('Show',backref='venue',lazy=True, cascade="delete")    
 
 class Artist(db.Model):
     __tablename__ = 'Artist'
+    __table_args__ = (
+        # keyset pagination of /artists
+        db.Index('ix_artist_name_id', 'name', 'id'),
+        db.Index('ix_artist_genres', 'genres', postgresql_using='gin').ddl_if(dialect='postgresql'),
+        # sweep of artists whose next show has started
+        db.Index('ix_artist_next_show_at', 'next_show_at'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String, nullable=False)
     city = db.Column(db.String(120), nullable=False)
     state = db.Column(db.String(120), nullable=False)
     phone = db.Column(db.String(120), nullable=False)
-    genres = db.Column(db.String(120), nullable=False)
+    genres = db.Column(Genres, nullable=False)
     image_link = db.Column(db.String(500))
     facebook_link = db.Column(db.String(120), nullable=False)
 
@@ -41,14 +152,335 @@ class Artist(db.Model):
 
     seeking_venue = db.Column(db.Boolean,default=False)
     seeking_description = db.Column(db.String(500))
+
+    # denormalized from Show, see refresh_show_counters()
+    upcoming_show_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    next_show_at = db.Column(db.DateTime)
+    # validator of the conditional GETs of the detail pages, set by the database clock in UTC
+    updated_at = db.Column(db.DateTime, nullable=False, default=utc_now(), onupdate=utc_now(),
+                           server_default=utc_now())
     shows = db.relationship('Show',backref='artist',lazy=True, cascade="delete")
 
 # TODO Implement Show and Artist models, and complete all model relationships and properties, as a database migration.
 
 class Show(db.Model):
     __tablename__ = 'Show'
+    __table_args__ = (
+        # shows of a venue / an artist around now (detail pages, upcoming counts)
+        db.Index('ix_show_venue_id_start_time', 'venue_id', 'start_time'),
+        db.Index('ix_show_artist_id_start_time', 'artist_id', 'start_time'),
+        # upcoming shows, keyset paginated on (start_time, id)
+        db.Index('ix_show_start_time_id', 'start_time', 'id'),
+        # no two shows of a venue, or of an artist, overlap (needs btree_gist)
+        ExcludeConstraint(('venue_id', '='), (db.text(SHOW_PERIOD), '&&'),
+                          name='ex_show_venue_period', using='gist').ddl_if(dialect='postgresql'),
+        ExcludeConstraint(('artist_id', '='), (db.text(SHOW_PERIOD), '&&'),
+                          name='ex_show_artist_period', using='gist').ddl_if(dialect='postgresql'),
+        db.CheckConstraint('duration BETWEEN 1 AND %d' % MAX_SHOW_MINUTES, name='ck_show_duration'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)   
     artist_id = db.Column(db.Integer,db.ForeignKey('Artist.id'),nullable=False)
     venue_id = db.Column(db.Integer,db.ForeignKey('Venue.id'),nullable=False)   
     start_time = db.Column(db.DateTime, nullable=False)
+    duration = db.Column(db.Integer, nullable=False, default=DEFAULT_SHOW_MINUTES,
+                         server_default=str(DEFAULT_SHOW_MINUTES))
+    updated_at = db.Column(db.DateTime, nullable=False, default=utc_now(), onupdate=utc_now(),
+                           server_default=utc_now())
+
+# the exclusion constraints compare integer ids with a GiST index
+event.listen(Show.__table__, 'before_create',
+             DDL('CREATE EXTENSION IF NOT EXISTS btree_gist').execute_if(dialect='postgresql'))
+
+class UpcomingShow(db.Model):
+    # Upcoming shows with the venue and artist columns /shows lists,
+    # maintained from Show, Venue and Artist, see refresh_show_feed().
+    __tablename__ = 'upcoming_show_feed'
+    __table_args__ = (
+        # /shows, keyset paginated on (start_time, show_id)
+        db.Index('ix_upcoming_show_feed_start_time_show_id', 'start_time', 'show_id'),
+        # refreshes after a venue or an artist changes
+        db.Index('ix_upcoming_show_feed_venue_id', 'venue_id'),
+        db.Index('ix_upcoming_show_feed_artist_id', 'artist_id'),
+    )
+
+    show_id = db.Column(db.Integer, db.ForeignKey('Show.id', ondelete='CASCADE'), primary_key=True, autoincrement=False)
+    start_time = db.Column(db.DateTime, nullable=False)
+    venue_id = db.Column(db.Integer, nullable=False)
+    venue_name = db.Column(db.String, nullable=False)
+    venue_image_link = db.Column(db.String(500))
+    artist_id = db.Column(db.Integer, nullable=False)
+    artist_name = db.Column(db.String, nullable=False)
+    artist_image_link = db.Column(db.String(500))
+
+
+#----------------------------------------------------------------------------#
+# Show counters.
+#----------------------------------------------------------------------------#
+
+def _show_counter_values(table, foreign_key, now):
+    upcoming = (foreign_key == table.c.id) & (Show.__table__.c.start_time > now)
+    return {
+        'upcoming_show_count': db.select(db.func.count(Show.__table__.c.id)).where(upcoming).scalar_subquery(),
+        'next_show_at': db.select(db.func.min(Show.__table__.c.start_time)).where(upcoming).scalar_subquery(),
+    }
+
+def refresh_show_counters(connection, venue_ids=(), artist_ids=(), now=None):
+    # Recomputes upcoming_show_count and next_show_at of the given venues and
+    # artists from their upcoming shows, one UPDATE per table. The correlated
+    # subqueries are range scans of the (venue_id/artist_id, start_time) indexes.
+    if now is None:
+        now = datetime.now()
+
+    show = Show.__table__
+    for table, foreign_key, ids in (
+        (Venue.__table__, show.c.venue_id, venue_ids),
+        (Artist.__table__, show.c.artist_id, artist_ids),
+    ):
+        ids = set(ids)
+        if not ids:
+            continue
+        connection.execute(
+            table.update()
+            .where(table.c.id.in_(ids))
+            .values(**_show_counter_values(table, foreign_key, now))
+        )
+
+def rebuild_show_counters(connection, now=None):
+    # Recomputes the counters of every venue and artist, after Show rows were
+    # written around the ORM (bulk inserts, imports).
+    if now is None:
+        now = datetime.now()
+
+    show = Show.__table__
+    for table, foreign_key in ((Venue.__table__, show.c.venue_id), (Artist.__table__, show.c.artist_id)):
+        connection.execute(table.update().values(**_show_counter_values(table, foreign_key, now)))
+
+def sweep_show_counters(connection, now=None):
+    # Ages shows from upcoming to past: refreshes the venues and artists whose
+    # next show has started since their counters were last computed.
+    if now is None:
+        now = datetime.now()
+
+    stale = {}
+    for model in (Venue, Artist):
+        table = model.__table__
+        stale[model] = connection.execute(
+            db.select(table.c.id).where(table.c.next_show_at <= now)
+        ).scalars().all()
+    refresh_show_counters(connection, stale[Venue], stale[Artist], now)
+    return len(stale[Venue]) + len(stale[Artist])
+
+#----------------------------------------------------------------------------#
+# Upcoming show feed.
+#----------------------------------------------------------------------------#
+
+# Show, Venue and Artist columns copied into upcoming_show_feed
+FEED_COLUMNS = ['show_id', 'start_time', 'venue_id', 'venue_name', 'venue_image_link',
+                'artist_id', 'artist_name', 'artist_image_link']
+
+def _feed_rows(now, *conditions):
+    # SELECT of the feed rows of the upcoming shows matching conditions
+    show = Show.__table__
+    venue = Venue.__table__
+    artist = Artist.__table__
+    return db.select(
+        show.c.id, show.c.start_time,
+        venue.c.id, venue.c.name, venue.c.image_link,
+        artist.c.id, artist.c.name, artist.c.image_link
+    ).select_from(
+        show.join(venue, show.c.venue_id == venue.c.id).join(artist, show.c.artist_id == artist.c.id)
+    ).where(show.c.start_time > now, *conditions)
+
+def refresh_show_feed(connection, show_ids=(), venue_ids=(), artist_ids=(), now=None):
+    # Rewrites the feed rows of the given shows and of the shows of the given
+    # venues and artists: deletes them, then copies back the ones still
+    # upcoming, in two statements.
+    if now is None:
+        now = datetime.now()
+
+    show = Show.__table__
+    feed = UpcomingShow.__table__
+    feed_conditions = []
+    show_conditions = []
+    for feed_column, show_column, ids in (
+        (feed.c.show_id, show.c.id, show_ids),
+        (feed.c.venue_id, show.c.venue_id, venue_ids),
+        (feed.c.artist_id, show.c.artist_id, artist_ids),
+    ):
+        ids = set(ids)
+        if ids:
+            feed_conditions.append(feed_column.in_(ids))
+            show_conditions.append(show_column.in_(ids))
+    if not feed_conditions:
+        return
+
+    connection.execute(feed.delete().where(db.or_(*feed_conditions)))
+    connection.execute(feed.insert().from_select(FEED_COLUMNS, _feed_rows(now, db.or_(*show_conditions))))
+
+def rebuild_show_feed(connection, now=None):
+    # Rewrites the whole feed, after Show rows were written around the ORM.
+    if now is None:
+        now = datetime.now()
+
+    feed = UpcomingShow.__table__
+    connection.execute(feed.delete())
+    connection.execute(feed.insert().from_select(FEED_COLUMNS, _feed_rows(now)))
+
+def sweep_show_feed(connection, now=None):
+    # Drops the shows that have started from the feed; returns how many.
+    if now is None:
+        now = datetime.now()
+
+    feed = UpcomingShow.__table__
+    return connection.execute(feed.delete().where(feed.c.start_time <= now)).rowcount
+
+def _show_end(show, dialect):
+    # start_time + duration minutes, as an SQL expression
+    if dialect == 'sqlite':
+        return db.func.datetime(show.c.start_time, '+' + db.cast(show.c.duration, db.String) + ' minutes')
+    return show.c.start_time + show.c.duration * db.literal_column("interval '1 minute'", db.Interval)
+
+def _overlapping_show(show, dialect, foreign_key, value, start_time, end_time, earliest):
+    # EXISTS probe for a show of foreign_key = value overlapping the period.
+    # Shows last at most MAX_SHOW_MINUTES, so only the ones starting in
+    # (earliest, end_time), earliest being start_time - MAX_SHOW_MINUTES, can
+    # overlap it: one bounded range scan of the (venue_id/artist_id,
+    # start_time) index.
+    return db.exists().where(
+        foreign_key == value,
+        show.c.start_time > earliest,
+        show.c.start_time < end_time,
+        _show_end(show, dialect) > start_time
+    )
+
+# shows probed per statement by overlapping_shows(), well within the bind
+# parameter limits of SQLite and PostgreSQL
+OVERLAP_PROBE_BATCH = 1000
+
+def overlapping_shows(connection, shows):
+    # Positions in shows (dicts of venue_id, artist_id, start_time and
+    # duration) of the ones overlapping a show of the table, with the probes
+    # of insert_show() run against a VALUES list of OVERLAP_PROBE_BATCH shows
+    # per statement.
+    show = Show.__table__
+    dialect = connection.dialect.name
+    found = set()
+    for first in range(0, len(shows), OVERLAP_PROBE_BATCH):
+        candidate = db.values(
+            db.column('position', db.Integer),
+            db.column('venue_id', db.Integer),
+            db.column('artist_id', db.Integer),
+            db.column('start_time', db.DateTime),
+            db.column('end_time', db.DateTime),
+            db.column('earliest', db.DateTime),
+            name='candidate'
+        ).data([
+            (position, row['venue_id'], row['artist_id'], row['start_time'],
+             row['start_time'] + timedelta(minutes=row['duration']),
+             row['start_time'] - timedelta(minutes=MAX_SHOW_MINUTES))
+            for position, row in enumerate(shows[first:first + OVERLAP_PROBE_BATCH], first)
+        ]).cte('candidate')
+        found.update(connection.execute(
+            db.select(candidate.c.position).where(db.or_(*[
+                _overlapping_show(show, dialect, foreign_key, value,
+                                  candidate.c.start_time, candidate.c.end_time, candidate.c.earliest)
+                for foreign_key, value in ((show.c.venue_id, candidate.c.venue_id),
+                                           (show.c.artist_id, candidate.c.artist_id))
+            ]))
+        ).scalars())
+    return found
+
+# the exclusion constraints refusing overlapping shows, see Show
+SHOW_PERIOD_CONSTRAINTS = ('ex_show_venue_period', 'ex_show_artist_period')
+
+def show_insert_refusal(error):
+    # What an IntegrityError raised by insert_show() means: 'conflict' when
+    # an exclusion constraint refused a show booked concurrently, 'missing'
+    # when a foreign key did (the venue or artist deleted since the probe),
+    # else None.
+    message = str(error.orig)
+    if any(name in message for name in SHOW_PERIOD_CONSTRAINTS):
+        return 'conflict'
+    # SQLSTATE of psycopg 3 / psycopg2, message of sqlite3
+    sqlstate = getattr(error.orig, 'sqlstate', None) or getattr(error.orig, 'pgcode', None)
+    if sqlstate == '23503' or 'FOREIGN KEY constraint failed' in message:
+        return 'missing'
+    return None
+
+def insert_show(connection, venue_id, artist_id, start_time, duration=DEFAULT_SHOW_MINUTES):
+    # Inserts a show with one INSERT ... SELECT that only yields a row when
+    # both the venue and the artist exist and neither has an overlapping
+    # show, so the checks run in the same statement, and refreshes their
+    # counters and the feed (Core inserts bypass the flush hooks below). Returns
+    # 'inserted', 'missing' (unknown venue or artist) or 'conflict'.
+    # Concurrent bookings that race past the probe are stopped by the
+    # exclusion constraints on PostgreSQL, raising IntegrityError (see
+    # show_insert_refusal()).
+    show = Show.__table__.alias('other')
+    venue = Venue.__table__
+    artist = Artist.__table__
+    dialect = connection.dialect.name
+    end_time = start_time + timedelta(minutes=duration)
+    earliest = start_time - timedelta(minutes=MAX_SHOW_MINUTES)
+
+    show_id = connection.execute(
+        Show.__table__.insert().from_select(
+            ['venue_id', 'artist_id', 'start_time', 'duration'],
+            db.select(venue.c.id, artist.c.id,
+                      db.literal(start_time, db.DateTime), db.literal(duration, db.Integer))
+            .select_from(venue.join(artist, db.true()))
+            .where(
+                venue.c.id == venue_id,
+                artist.c.id == artist_id,
+                ~_overlapping_show(show, dialect, show.c.venue_id, venue_id, start_time, end_time, earliest),
+                ~_overlapping_show(show, dialect, show.c.artist_id, artist_id, start_time, end_time, earliest)
+            )
+        ).returning(Show.__table__.c.id)
+    ).scalar()
+    if show_id is None:
+        # tells a missing venue or artist from a conflict, off the happy path
+        found = connection.execute(db.select(
+            db.exists().where(venue.c.id == venue_id),
+            db.exists().where(artist.c.id == artist_id)
+        )).one()
+        return 'conflict' if all(found) else 'missing'
+    refresh_show_counters(connection, [venue_id], [artist_id])
+    refresh_show_feed(connection, show_ids=[show_id])
+    return 'inserted'
+
+@event.listens_for(Session, 'after_flush')
+def _refresh_counters_after_flush(session, flush_context):
+    # keeps the counters in step with Show rows written through the ORM, in
+    # the same transaction
+    venue_ids = set()
+    artist_ids = set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if not isinstance(obj, Show):
+            continue
+        state = inspect(obj)
+        for attr, ids in (('venue_id', venue_ids), ('artist_id', artist_ids)):
+            history = state.attrs[attr].history
+            ids.update(value for value in history.sum() if value is not None)
+            value = getattr(obj, attr)
+            if value is not None:
+                ids.add(value)
+    if venue_ids or artist_ids:
+        refresh_show_counters(session.connection(), venue_ids, artist_ids)
+
+@event.listens_for(Session, 'after_flush')
+def _refresh_feed_after_flush(session, flush_context):
+    # keeps upcoming_show_feed in step with the Show rows, and the venue and
+    # artist columns it copies, written through the ORM
+    show_ids = set()
+    venue_ids = set()
+    artist_ids = set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Show):
+            show_ids.add(obj.id)
+        elif isinstance(obj, (Venue, Artist)) and obj not in session.new:
+            state = inspect(obj)
+            if any(state.attrs[attr].history.has_changes() for attr in ('name', 'image_link')):
+                (venue_ids if isinstance(obj, Venue) else artist_ids).add(obj.id)
+    if show_ids or venue_ids or artist_ids:
+        refresh_show_feed(session.connection(), show_ids, venue_ids, artist_ids)
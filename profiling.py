@@ -0,0 +1,173 @@
+import threading
+import time
+from collections import Counter
+from flask import g, has_request_context, request, before_render_template, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+#----------------------------------------------------------------------------#
+# Request profiling.
+#----------------------------------------------------------------------------#
+
+# Every request records its SQL statements (count and time, from the cursor
+# events of all engines), its template render time and its latency. Totals
+# are kept per endpoint in this process and exported in the Prometheus text
+# format by render_metrics(). A statement run more than N_PLUS_ONE_THRESHOLD
+# times in one request is logged as a likely N+1 query.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class Profile(object):
+    # what one request spent, in seconds
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.render_seconds = 0.0
+        self.statements = Counter()
+
+    def repeated(self, threshold):
+        # (statement, count) of the statements run more than threshold times
+        return [(statement, count) for statement, count in self.statements.items() if count > threshold]
+
+    def header(self):
+        return 'queries=%d; db=%.1fms; render=%.1fms; total=%.1fms' % (
+            self.queries, self.db_seconds * 1000, self.render_seconds * 1000,
+            (time.perf_counter() - self.started) * 1000)
+
+class EndpointStats(object):
+
+    def __init__(self):
+        self.requests = Counter()  # (method, status) -> count
+        self.latency_buckets = [0] * len(LATENCY_BUCKETS)
+        self.latency_seconds = 0.0
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.render_seconds = 0.0
+        self.n_plus_one = 0
+
+    def add(self, method, status, profile, latency, repeated):
+        self.requests[method, status] += 1
+        for index, bound in enumerate(LATENCY_BUCKETS):
+            if latency <= bound:
+                self.latency_buckets[index] += 1
+        self.latency_seconds += latency
+        self.queries += profile.queries
+        self.db_seconds += profile.db_seconds
+        self.render_seconds += profile.render_seconds
+        self.n_plus_one += bool(repeated)
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+class RequestProfiler(object):
+
+    def __init__(self, app=None):
+        self.stats = {}  # endpoint -> EndpointStats
+        self.lock = threading.Lock()
+        self.threshold = 5
+        self.send_header = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.threshold = app.config.get('PROFILE_N_PLUS_ONE_THRESHOLD', 5)
+        self.send_header = app.config.get('PROFILE_HEADER', False)
+        app.before_request(self._start)
+        app.after_request(self._finish)
+        before_render_template.connect(self._before_render, app)
+        template_rendered.connect(self._after_render, app)
+        if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+            event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+
+    def _start(self):
+        g.profile = Profile()
+
+    def _before_render(self, sender, template, context, **extra):
+        g.render_started = time.perf_counter()
+
+    def _after_render(self, sender, template, context, **extra):
+        if 'profile' in g and 'render_started' in g:
+            g.profile.render_seconds += time.perf_counter() - g.pop('render_started')
+
+    def _finish(self, response):
+        profile = g.get('profile')
+        if profile is None:
+            return response
+        if self.send_header:
+            response.headers['X-Request-Profile'] = profile.header()
+
+        # streamed bodies run their queries after this hook, so the request
+        # is recorded once the response is closed
+        endpoint = request.endpoint or 'unmatched'
+        method = request.method
+        path = request.path
+        response.call_on_close(lambda: self._record(endpoint, method, path, response.status_code, profile))
+        return response
+
+    def _record(self, endpoint, method, path, status, profile):
+        latency = time.perf_counter() - profile.started
+        repeated = profile.repeated(self.threshold)
+        for statement, count in repeated:
+            self.app.logger.warning('N+1 query on %s %s: %d x %s', method, path, count, ' '.join(statement.split()))
+        with self.lock:
+            stats = self.stats.setdefault(endpoint, EndpointStats())
+            stats.add(method, status, profile, latency, repeated)
+
+    def render_metrics(self):
+        # the totals of this process in the Prometheus text exposition format
+        lines = []
+
+        def family(name, kind, help):
+            lines.append('# HELP %s %s' % (name, help))
+            lines.append('# TYPE %s %s' % (name, kind))
+
+        with self.lock:
+            stats = sorted(self.stats.items())
+
+            family('fyyur_requests_total', 'counter', 'Requests served, by endpoint, method and status.')
+            for endpoint, endpoint_stats in stats:
+                for (method, status), count in sorted(endpoint_stats.requests.items()):
+                    lines.append('fyyur_requests_total{endpoint="%s",method="%s",status="%s"} %d' % (
+                        _label(endpoint), method, status, count))
+
+            family('fyyur_request_duration_seconds', 'histogram', 'Request latency, by endpoint.')
+            for endpoint, endpoint_stats in stats:
+                label = _label(endpoint)
+                for bound, count in zip(LATENCY_BUCKETS, endpoint_stats.latency_buckets):
+                    lines.append('fyyur_request_duration_seconds_bucket{endpoint="%s",le="%s"} %d' % (label, bound, count))
+                total = sum(endpoint_stats.requests.values())
+                lines.append('fyyur_request_duration_seconds_bucket{endpoint="%s",le="+Inf"} %d' % (label, total))
+                lines.append('fyyur_request_duration_seconds_sum{endpoint="%s"} %f' % (label, endpoint_stats.latency_seconds))
+                lines.append('fyyur_request_duration_seconds_count{endpoint="%s"} %d' % (label, total))
+
+            for name, attribute, kind, help in (
+                ('fyyur_db_queries_total', 'queries', 'counter', 'SQL statements executed, by endpoint.'),
+                ('fyyur_db_seconds_total', 'db_seconds', 'counter', 'Time spent executing SQL, by endpoint.'),
+                ('fyyur_render_seconds_total', 'render_seconds', 'counter', 'Time spent rendering templates, by endpoint.'),
+                ('fyyur_n_plus_one_total', 'n_plus_one', 'counter', 'Requests repeating a statement more than the N+1 threshold, by endpoint.'),
+            ):
+                family(name, kind, help)
+                for endpoint, endpoint_stats in stats:
+                    value = getattr(endpoint_stats, attribute)
+                    lines.append('%s{endpoint="%s"} %s' % (name, _label(endpoint), value if isinstance(value, int) else '%f' % value))
+
+        return '\n'.join(lines) + '\n'
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context.profile_started = time.perf_counter()
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, 'profile_started', None)
+    if started is None or not has_request_context():
+        return
+    profile = g.get('profile')
+    if profile is not None:
+        profile.queries += 1
+        profile.db_seconds += time.perf_counter() - started
+        profile.statements[statement] += 1
+
+profiler = RequestProfiler()
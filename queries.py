@@ -0,0 +1,313 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import namedtuple
+from datetime import datetime, timezone
+from itertools import groupby
+from sqlalchemy import DateTime, case, func, select, tuple_
+from cache import response_cache
+from models import db, Venue, Artist, Show, UpcomingShow
+#----------------------------------------------------------------------------#
+# Queries.
+#----------------------------------------------------------------------------#
+
+PAGE_SIZE = 20
+
+# The query functions take the session to run on, db.session by default;
+# asgi.py passes the synchronous facade of an AsyncSession (run_sync).
+
+# items of one page, plus the cursors of the pages after and before it
+# (None when there is no such page)
+Page = namedtuple('Page', ['items', 'next_cursor', 'prev_cursor'])
+
+# validators of a conditional GET, see conditional.py
+PageValidators = namedtuple('PageValidators', ['last_modified', 'version'])
+
+def encode_cursor(values):
+    values = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    return urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip('=')
+
+def decode_cursor(cursor, columns):
+    # Raises ValueError for a cursor that was not produced by encode_cursor
+    # for the same columns.
+    try:
+        values = json.loads(urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        if not isinstance(values, list) or len(values) != len(columns):
+            raise ValueError('malformed cursor')
+        return [
+            datetime.fromisoformat(value) if isinstance(column.type, DateTime)
+            else column.type.python_type(value)
+            for column, value in zip(columns, values)
+        ]
+    except TypeError:
+        raise ValueError('malformed cursor')
+
+def keyset_page(query, columns, after=None, before=None, limit=PAGE_SIZE):
+    # Seeks past the after (or before) cursor on the unique, indexed ordering
+    # columns, so a deep page costs the same index range scan as the first.
+    key = tuple_(*columns)
+    names = [column.key for column in columns]
+
+    def cursor(row):
+        return encode_cursor([getattr(row, name) for name in names])
+
+    if before is not None:
+        rows = query.filter(key < tuple_(*decode_cursor(before, columns))) \
+            .order_by(*[column.desc() for column in columns]) \
+            .limit(limit + 1) \
+            .all()
+        has_more = len(rows) > limit
+        rows = rows[:limit][::-1]
+        return Page(
+            rows,
+            cursor(rows[-1]) if rows else None,
+            cursor(rows[0]) if has_more else None
+        )
+
+    if after is not None:
+        query = query.filter(key > tuple_(*decode_cursor(after, columns)))
+    rows = query.order_by(*columns).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return Page(
+        rows,
+        cursor(rows[-1]) if has_more else None,
+        cursor(rows[0]) if after is not None and rows else None
+    )
+
+def genre_filter(column, genre, session=None):
+    # Criterion for rows whose genres contain genre: an @> probe of the GIN
+    # index on PostgreSQL, a json_each scan on SQLite.
+    if (session or db.session).get_bind().dialect.name == 'postgresql':
+        return column.contains([genre])
+    genres = func.json_each(column).table_valued('value')
+    return select(genres.c.value).where(genres.c.value == genre).exists()
+
+def venues_by_area(after=None, before=None, limit=PAGE_SIZE, genre=None, session=None):
+    # Builds one page of the area -> venues -> num_upcoming_shows tree for
+    # /venues from the denormalized Venue counters, in a single query.
+    # Venues are paged by (name, id) then grouped by area.
+    session = session or db.session
+    query = session.query(
+        Venue.city,
+        Venue.state,
+        Venue.id,
+        Venue.name,
+        Venue.upcoming_show_count
+    )
+    if genre:
+        query = query.filter(genre_filter(Venue.genres, genre, session))
+    page = keyset_page(query, [Venue.name, Venue.id], after, before, limit)
+
+    areas = []
+    rows = sorted(page.items, key=lambda row: (row.state, row.city))
+    for (city, state), area_rows in groupby(rows, key=lambda row: (row.city, row.state)):
+        areas.append({
+            "city": city,
+            "state": state,
+            "venues": [{
+                "id": row.id,
+                "name": row.name,
+                "num_upcoming_shows": row.upcoming_show_count
+            } for row in area_rows]
+        })
+    return page._replace(items=areas)
+
+def artists_page(after=None, before=None, limit=PAGE_SIZE, genre=None, session=None):
+    session = session or db.session
+    query = session.query(Artist.id, Artist.name)
+    if genre:
+        query = query.filter(genre_filter(Artist.genres, genre, session))
+    return keyset_page(query, [Artist.name, Artist.id], after, before, limit)
+
+def upcoming_shows_page(after=None, before=None, limit=PAGE_SIZE, now=None, session=None):
+    # One page of upcoming shows with their venue and artist columns, paged
+    # by (start_time, show id): a range scan of the upcoming_show_feed index.
+    # Shows that started since the last feed sweep are filtered out here.
+    if now is None:
+        now = datetime.now()
+
+    query = (session or db.session).query(
+        UpcomingShow.show_id,
+        UpcomingShow.venue_id,
+        UpcomingShow.venue_name,
+        UpcomingShow.artist_id,
+        UpcomingShow.artist_name,
+        UpcomingShow.artist_image_link,
+        UpcomingShow.start_time
+    ).filter(UpcomingShow.start_time > now)
+    page = keyset_page(query, [UpcomingShow.start_time, UpcomingShow.show_id], after, before, limit)
+    return page._replace(items=[row._asdict() for row in page.items])
+
+def _split_shows(rows, keys):
+    # rows carry an "upcoming" flag computed by the database against a single
+    # reference timestamp, so the list is split in one pass.
+    past_shows = []
+    upcoming_shows = []
+    for row in rows:
+        show = dict(zip(keys, row))
+        show["start_time"] = row.start_time
+        (upcoming_shows if row.upcoming else past_shows).append(show)
+    return past_shows, upcoming_shows
+
+def venue_shows(venue_id, now=None, session=None):
+    # Returns (past_shows, upcoming_shows) of a venue with the artist columns
+    # the venue page needs, from one joined query.
+    if now is None:
+        now = datetime.now()
+
+    rows = (session or db.session).query(
+        Show.artist_id,
+        Artist.name,
+        Artist.image_link,
+        Show.start_time,
+        (Show.start_time > now).label('upcoming')
+    ).join(Artist, Show.artist_id == Artist.id) \
+     .filter(Show.venue_id == venue_id) \
+     .order_by(Show.start_time, Show.id) \
+     .all()
+    return _split_shows(rows, ("artist_id", "artist_name", "artist_image_link"))
+
+def artist_shows(artist_id, now=None, session=None):
+    # Returns (past_shows, upcoming_shows) of an artist with the venue columns
+    # the artist page needs, from one joined query.
+    if now is None:
+        now = datetime.now()
+
+    rows = (session or db.session).query(
+        Show.venue_id,
+        Venue.name,
+        Venue.image_link,
+        Show.start_time,
+        (Show.start_time > now).label('upcoming')
+    ).join(Venue, Show.venue_id == Venue.id) \
+     .filter(Show.artist_id == artist_id) \
+     .order_by(Show.start_time, Show.id) \
+     .all()
+    return _split_shows(rows, ("venue_id", "venue_name", "venue_image_link"))
+
+def venue_detail(venue_id, now=None, session=None):
+    # The venue page data of venue_id, or None when there is no such venue.
+    session = session or db.session
+    venue_row = session.get(Venue, venue_id)
+    if venue_row is None:
+        return None
+
+    past_shows, upcoming_shows = venue_shows(venue_id, now, session)
+    return {
+        "id": venue_row.id,
+        "name": venue_row.name,
+        "genres": venue_row.genres,
+        "address": venue_row.address,
+        "city": venue_row.city,
+        "state": venue_row.state,
+        "phone": venue_row.phone,
+        "website": venue_row.website,
+        "facebook_link": venue_row.facebook_link,
+        "seeking_talent": venue_row.seeking_talent,
+        "image_link": venue_row.image_link,
+        "past_shows": past_shows,
+        "upcoming_shows": upcoming_shows,
+        "past_shows_count": len(past_shows),
+        "upcoming_shows_count": len(upcoming_shows),
+    }
+
+def artist_detail(artist_id, now=None, session=None):
+    # The artist page data of artist_id, or None when there is no such artist.
+    session = session or db.session
+    artist_row = session.get(Artist, artist_id)
+    if artist_row is None:
+        return None
+
+    past_shows, upcoming_shows = artist_shows(artist_id, now, session)
+    return {
+        "id": artist_row.id,
+        "name": artist_row.name,
+        "genres": artist_row.genres,
+        "city": artist_row.city,
+        "state": artist_row.state,
+        "phone": artist_row.phone,
+        "website": artist_row.website,
+        "facebook_link": artist_row.facebook_link,
+        "seeking_venue": artist_row.seeking_venue,
+        "image_link": artist_row.image_link,
+        "past_shows": past_shows,
+        "upcoming_shows": upcoming_shows,
+        "past_shows_count": len(past_shows),
+        "upcoming_shows_count": len(upcoming_shows),
+    }
+
+def local_to_utc(value):
+    # a naive local time (show start times, datetime.now()) as naive UTC,
+    # the clock of the updated_at stamps
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+def _page_validators(model, foreign_key, other, other_key, entity_id, now, session):
+    # (last modified, version) of the detail page of entity_id, from one
+    # aggregate over its row and its shows (the (venue_id/artist_id,
+    # start_time) index) with the venue or artist of each. A page also
+    # changes when one of its shows starts, so the last start is a
+    # modification, and the upcoming count is part of the version. The last
+    # modified time is naive UTC, as the updated_at stamps are.
+    if now is None:
+        now = datetime.now()
+
+    row = (session or db.session).query(
+        model.updated_at,
+        func.max(Show.updated_at),
+        func.max(other.updated_at),
+        func.count(Show.id),
+        func.count(case((Show.start_time > now, Show.id))),
+        func.max(case((Show.start_time <= now, Show.start_time)))
+    ).select_from(model) \
+     .outerjoin(Show, foreign_key == model.id) \
+     .outerjoin(other, other_key == other.id) \
+     .filter(model.id == entity_id) \
+     .group_by(model.id, model.updated_at) \
+     .first()
+    if row is None:
+        return None
+    updated_at, shows_updated_at, others_updated_at, show_count, upcoming_count, last_start = row
+    if last_start is not None:
+        last_start = local_to_utc(last_start)
+    last_modified = max(value for value in (updated_at, shows_updated_at, others_updated_at, last_start)
+                        if value is not None)
+    return PageValidators(last_modified, (updated_at, shows_updated_at, others_updated_at, show_count, upcoming_count))
+
+def venue_validators(venue_id, now=None, session=None):
+    # Validators of the venue page of venue_id, or None when there is no such venue.
+    return _page_validators(Venue, Show.venue_id, Artist, Show.artist_id, venue_id, now, session)
+
+def artist_validators(artist_id, now=None, session=None):
+    # Validators of the artist page of artist_id, or None when there is no such artist.
+    return _page_validators(Artist, Show.artist_id, Venue, Show.venue_id, artist_id, now, session)
+
+def collection_validators(*models, session=None):
+    # Validators of an export of every row of models, from one statement of
+    # aggregates per table: the last update, and a version that also moves
+    # when rows are inserted or deleted (row count, highest id).
+    row = (session or db.session).execute(select(*[
+        select(aggregate).scalar_subquery()
+        for model in models
+        for aggregate in (func.max(model.updated_at), func.count(model.id), func.max(model.id))
+    ])).one()
+    updated = [value for value in row[::3] if value is not None]
+    return PageValidators(max(updated, default=datetime(1970, 1, 1)), tuple(row))
+
+def show_names(venue_id, artist_id):
+    # (venue name, artist name) of a new show, or None when either is gone.
+    # Each name is cached under a tag of its own ('name:venue:3', ...), which
+    # renames and deletes invalidate but new shows do not.
+    keys = ('name:venue:%s' % venue_id, 'name:artist:%s' % artist_id)
+    names = tuple(response_cache.get(key) for key in keys)
+    if None not in names:
+        return names
+
+    row = db.session.query(Venue.name, Artist.name) \
+        .select_from(Venue).join(Artist, db.true()) \
+        .filter(Venue.id == venue_id, Artist.id == artist_id) \
+        .one_or_none()
+    if row is None:
+        return None
+    for key, name in zip(keys, row):
+        response_cache.set(key, name, key)
+    return tuple(row)
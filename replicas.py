@@ -0,0 +1,60 @@
+import random
+import time
+from functools import wraps
+from flask import g, request, session
+from models import engine_options
+#----------------------------------------------------------------------------#
+# Read replicas.
+#----------------------------------------------------------------------------#
+
+# Views decorated with ReplicaRouter.replica read from one of the replicas
+# in REPLICA_DATABASE_URIS, registered as the binds 'replica_0', 'replica_1',
+# ...; every other view reads and writes the primary. A request that may
+# write (anything but GET/HEAD/OPTIONS outside a replica view) pins the
+# visitor's reads to the primary for REPLICA_STICKY_SECONDS, through their
+# session cookie, so they see their own writes despite replication lag.
+
+def pinned_to_primary():
+    # whether the visitor wrote in the last REPLICA_STICKY_SECONDS
+    return session.get('_primary_until', 0) > time.time()
+
+def replica_binds(config):
+    # SQLALCHEMY_BINDS entries of the replicas, with the engine options of
+    # the primary
+    return {
+        'replica_%d' % number: dict(url=uri, **engine_options(config, uri))
+        for number, uri in enumerate(config.get('REPLICA_DATABASE_URIS', []))
+    }
+
+class ReplicaRouter(object):
+
+    def __init__(self, app=None):
+        self.binds = []
+        self.sticky_seconds = 5
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        # call before db.init_app(app), which creates the engines
+        binds = replica_binds(app.config)
+        app.config.setdefault('SQLALCHEMY_BINDS', {}).update(binds)
+        self.binds = sorted(binds)
+        self.sticky_seconds = app.config.get('REPLICA_STICKY_SECONDS', 5)
+        app.after_request(self._pin_writers)
+
+    def replica(self, view):
+        # marks a view as read-only, to be served by a replica
+        @wraps(view)
+        def wrapper(**kwargs):
+            g.db_read_only = True
+            if self.binds and not pinned_to_primary():
+                g.db_replica = random.choice(self.binds)
+            return view(**kwargs)
+        return wrapper
+
+    def _pin_writers(self, response):
+        if request.method not in ('GET', 'HEAD', 'OPTIONS') and not g.get('db_read_only'):
+            session['_primary_until'] = time.time() + self.sticky_seconds
+        return response
+
+replica_router = ReplicaRouter()
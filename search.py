@@ -0,0 +1,116 @@
+import re
+from sqlalchemy import DDL, and_, case, event, func, literal_column, or_, table, column
+from models import db, Venue, Artist
+#----------------------------------------------------------------------------#
+# Search.
+#----------------------------------------------------------------------------#
+
+# Searches match every word of the search term as a case-insensitive
+# substring of name, city, state or genres ("a" finds "Guns N Petals"), and
+# rank the rows matching on the name first. On PostgreSQL they run ILIKE
+# against the "search_text" column, GIN indexed with pg_trgm by migration
+# 4c1f0d9a7e52. On SQLite they run against FTS5 tables with the trigram
+# tokenizer, kept in sync by triggers, so search can be exercised locally.
+# Both indexes only narrow down words of at least three characters; shorter
+# ones are matched by scanning.
+
+SEARCH_LIMIT = 50
+
+# shortest term the trigram indexes can look up
+TRIGRAM = 3
+
+SEARCH_COLUMNS = ('name', 'city', 'state', 'genres')
+
+FTS_TABLES = {
+    'Venue': 'venue_fts',
+    'Artist': 'artist_fts',
+}
+
+def sqlite_fts_ddl(table_name, fts_name):
+    # Statements creating the FTS5 index of table_name and the triggers that
+    # keep it in sync. Also used by the migration for SQLite databases.
+    columns = ', '.join(SEARCH_COLUMNS)
+    new_values = ', '.join('new.' + name for name in SEARCH_COLUMNS)
+    old_values = ', '.join('old.' + name for name in SEARCH_COLUMNS)
+    insert = "INSERT INTO {fts}(rowid, {columns}) VALUES (new.id, {new_values});"
+    delete = "INSERT INTO {fts}({fts}, rowid, {columns}) VALUES ('delete', old.id, {old_values});"
+    statements = [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({columns}, "
+        "content='{table}', content_rowid='id', tokenize='trigram')",
+        "CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON \"{table}\" BEGIN " + insert + " END",
+        "CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON \"{table}\" BEGIN " + delete + " END",
+        "CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE ON \"{table}\" BEGIN " + delete + " " + insert + " END",
+    ]
+    return [statement.format(
+        fts=fts_name,
+        table=table_name,
+        columns=columns,
+        new_values=new_values,
+        old_values=old_values
+    ) for statement in statements]
+
+# create the FTS5 tables alongside db.create_all() on SQLite
+for model in (Venue, Artist):
+    for statement in sqlite_fts_ddl(model.__tablename__, FTS_TABLES[model.__tablename__]):
+        event.listen(model.__table__, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+
+def search_terms(search_term):
+    return re.findall(r'\w+', search_term.lower())
+
+def substring_pattern(term):
+    # LIKE pattern of term anywhere, '_' being a word character
+    return '%' + term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+
+def search(model, search_term, limit=SEARCH_LIMIT, session=None):
+    # Returns (id, name, upcoming_show_count, total) rows of model matching
+    # every word of search_term, best match first; total counts all the
+    # matches, not only the limit returned. An empty search term lists
+    # everything by name.
+    session = session or db.session
+    terms = search_terms(search_term)
+    query = session.query(model.id, model.name, model.upcoming_show_count, func.count().over().label('total'))
+
+    if not terms:
+        return query.order_by(model.name, model.id).limit(limit).all()
+
+    patterns = [substring_pattern(term) for term in terms]
+    name_match = case((and_(*[model.name.ilike(pattern, escape='\\') for pattern in patterns]), 0), else_=1)
+    dialect = session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        search_text = literal_column('"%s".search_text' % model.__tablename__)
+        for pattern in patterns:
+            query = query.filter(search_text.ilike(pattern, escape='\\'))
+        query = query.order_by(name_match, func.word_similarity(' '.join(terms), search_text).desc(),
+                               model.name, model.id)
+    elif dialect == 'sqlite':
+        fts_name = FTS_TABLES[model.__tablename__]
+        fts = table(fts_name, column('rowid'), column('rank'), *[column(name) for name in SEARCH_COLUMNS])
+        query = query.join(fts, fts.c.rowid == model.id)
+        indexed = [term for term in terms if len(term) >= TRIGRAM]
+        if indexed:
+            # the trigram tokenizer matches each quoted term as a substring
+            query = query.filter(literal_column(fts_name).op('MATCH')(' '.join('"%s"' % term for term in indexed)))
+        for term, pattern in zip(terms, patterns):
+            if len(term) < TRIGRAM:
+                query = query.filter(or_(*[fts.c[name].like(pattern, escape='\\') for name in SEARCH_COLUMNS]))
+        query = query.order_by(name_match, fts.c.rank, model.name, model.id)
+    else:
+        for pattern in patterns:
+            query = query.filter(model.name.ilike(pattern, escape='\\'))
+        query = query.order_by(model.name, model.id)
+
+    return query.limit(limit).all()
+
+def search_results(model, search_term, limit=SEARCH_LIMIT, session=None):
+    # The results of a search page: {"count": n, "data": [{"id", "name",
+    # "num_upcoming_shows"}, ...]}, count being the number of matches, of
+    # which data lists the first limit.
+    rows = search(model, search_term, limit, session)
+    return {
+        "count": rows[0].total if rows else 0,
+        "data": [{
+            "id": row.id,
+            "name": row.name,
+            "num_upcoming_shows": row.upcoming_show_count
+        } for row in rows]
+    }
@@ -0,0 +1,139 @@
+import random
+from datetime import datetime, timedelta
+from models import db, Venue, Artist, Show, DEFAULT_SHOW_MINUTES, rebuild_show_counters, rebuild_show_feed
+#----------------------------------------------------------------------------#
+# Synthetic data.
+#----------------------------------------------------------------------------#
+
+# Generates venues, artists and shows in bulk for load testing, inserted with
+# bulk_insert_mappings and committed every batch_size rows.
+
+GENRES = [
+    'Alternative', 'Blues', 'Classical', 'Country', 'Electronic', 'Folk',
+    'Funk', 'Hip-Hop', 'Heavy Metal', 'Instrumental', 'Jazz',
+    'Musical Theatre', 'Pop', 'Punk', 'R&B', 'Reggae', 'Rock n Roll', 'Soul',
+]
+
+CITIES = [
+    ('San Francisco', 'CA'), ('Los Angeles', 'CA'), ('New York', 'NY'),
+    ('Brooklyn', 'NY'), ('Austin', 'TX'), ('Houston', 'TX'), ('Chicago', 'IL'),
+    ('Seattle', 'WA'), ('Portland', 'OR'), ('Nashville', 'TN'),
+    ('New Orleans', 'LA'), ('Denver', 'CO'), ('Boston', 'MA'), ('Miami', 'FL'),
+]
+
+ADJECTIVES = [
+    'Musical', 'Dueling', 'Wild', 'Electric', 'Velvet', 'Golden', 'Blue',
+    'Midnight', 'Rusty', 'Silver', 'Crimson', 'Lucky', 'Quiet', 'Loud',
+]
+
+NOUNS = [
+    'Hop', 'Pianos', 'Sax', 'Lounge', 'Garage', 'Cellar', 'Owl', 'Lantern',
+    'Harbor', 'Station', 'Orchard', 'Echo', 'Anchor', 'Comet',
+]
+
+def _name(rng, number, suffix):
+    return '%s %s %s %d' % (rng.choice(ADJECTIVES), rng.choice(NOUNS), suffix, number)
+
+def _phone(rng):
+    return '%03d%03d%04d' % (rng.randint(200, 999), rng.randint(0, 999), rng.randint(0, 9999))
+
+def generate_venues(count, rng):
+    for number in range(count):
+        city, state = rng.choice(CITIES)
+        yield {
+            'name': _name(rng, number, rng.choice(['Bar', 'Club', 'Hall', 'Live Music & Coffee'])),
+            'city': city,
+            'state': state,
+            'address': '%d %s Street' % (rng.randint(1, 9999), rng.choice(NOUNS)),
+            'phone': _phone(rng),
+            'genres': rng.sample(GENRES, rng.randint(1, 4)),
+            'facebook_link': 'https://www.facebook.com/venue%d' % number,
+            'website': 'https://www.venue%d.example.com' % number,
+            'seeking_talent': rng.random() < 0.3,
+            'upcoming_show_count': 0,
+        }
+
+def generate_artists(count, rng):
+    for number in range(count):
+        city, state = rng.choice(CITIES)
+        yield {
+            'name': _name(rng, number, rng.choice(['Band', 'Trio', 'Quartet', 'Collective'])),
+            'city': city,
+            'state': state,
+            'phone': _phone(rng),
+            'genres': rng.sample(GENRES, rng.randint(1, 3)),
+            'facebook_link': 'https://www.facebook.com/artist%d' % number,
+            'website': 'https://www.artist%d.example.com' % number,
+            'seeking_venue': rng.random() < 0.3,
+            'upcoming_show_count': 0,
+        }
+
+def generate_shows(count, venue_ids, artist_ids, rng, now):
+    # Shows are spread over a year either side of now, in slots of
+    # DEFAULT_SHOW_MINUTES, and no venue or artist is booked twice in a slot
+    # (the exclusion constraints would reject overlapping shows).
+    slots = 2 * 365 * 24 * 60 // DEFAULT_SHOW_MINUTES
+    if count > min(len(venue_ids), len(artist_ids)) * slots:
+        raise ValueError('not enough venues and artists for %d shows' % count)
+    first = now.replace(minute=0, second=0, microsecond=0) - timedelta(days=365)
+    booked = set()
+    generated = 0
+    while generated < count:
+        venue_id = rng.choice(venue_ids)
+        artist_id = rng.choice(artist_ids)
+        slot = rng.randrange(slots)
+        if ('venue', venue_id, slot) in booked or ('artist', artist_id, slot) in booked:
+            continue
+        booked.add(('venue', venue_id, slot))
+        booked.add(('artist', artist_id, slot))
+        generated += 1
+        yield {
+            'venue_id': venue_id,
+            'artist_id': artist_id,
+            'start_time': first + timedelta(minutes=slot * DEFAULT_SHOW_MINUTES),
+            'duration': DEFAULT_SHOW_MINUTES,
+        }
+
+def _insert(model, rows, batch_size):
+    inserted = 0
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == batch_size:
+            db.session.bulk_insert_mappings(model, batch)
+            db.session.commit()
+            inserted += len(batch)
+            batch = []
+    if batch:
+        db.session.bulk_insert_mappings(model, batch)
+        db.session.commit()
+        inserted += len(batch)
+    return inserted
+
+def bulk_seed(venues=0, artists=0, shows=0, batch_size=5000, random_seed=None, now=None):
+    # Inserts the given numbers of synthetic rows. Shows are spread over all
+    # venues and artists in the database, including the ones just added.
+    # Returns {'venues': n, 'artists': n, 'shows': n}.
+    if now is None:
+        now = datetime.now()
+    rng = random.Random(random_seed)
+
+    counts = {
+        'venues': _insert(Venue, generate_venues(venues, rng), batch_size),
+        'artists': _insert(Artist, generate_artists(artists, rng), batch_size),
+        'shows': 0,
+    }
+
+    if shows:
+        venue_ids = db.session.scalars(db.select(Venue.id)).all()
+        artist_ids = db.session.scalars(db.select(Artist.id)).all()
+        if not (venue_ids and artist_ids):
+            raise ValueError('shows need at least one venue and one artist')
+        counts['shows'] = _insert(Show, generate_shows(shows, venue_ids, artist_ids, rng, now), batch_size)
+        # bulk inserts bypass the flush hooks maintaining the show counters
+        # and the upcoming show feed
+        rebuild_show_counters(db.session.connection(), now)
+        rebuild_show_feed(db.session.connection(), now)
+        db.session.commit()
+
+    return counts
@@ -0,0 +1,50 @@
+import os
+import sys
+import tempfile
+import pytest
+#----------------------------------------------------------------------------#
+# Fixtures.
+#----------------------------------------------------------------------------#
+
+# The app reads config.py once, at import, so the environment points it at a
+# throwaway SQLite database before anything imports it. Every test gets the
+# schema created afresh in that file, and the file removed afterwards.
+
+TEST_DIR = tempfile.mkdtemp(prefix='fyyur-tests-')
+DATABASE_PATH = os.path.join(TEST_DIR, 'fyyur.db')
+
+os.environ.update({
+    'DATABASE_URL': 'sqlite:///' + DATABASE_PATH,
+    'CACHE_BACKEND': 'null',
+    'TEMPLATE_CACHE_DIR': '',
+    'ASSETS_MANIFEST': os.path.join(TEST_DIR, 'manifest.json'),
+    'IMAGE_CACHE_DIR': os.path.join(TEST_DIR, 'images'),
+    'LOG_FILE': '',
+    'LOG_REQUESTS': '0',
+    'PROFILE_HEADER': '1',
+})
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+@pytest.fixture
+def app():
+    from app import app
+    from models import db
+    app.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.engine.dispose()
+    os.remove(DATABASE_PATH)
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+def statement_count(response):
+    # statements the request ran, from the X-Request-Profile header (profiling.py)
+    for part in response.headers['X-Request-Profile'].split(';'):
+        name, _, value = part.strip().partition('=')
+        if name == 'queries':
+            return int(value)
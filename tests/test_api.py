@@ -0,0 +1,63 @@
+import json
+from datetime import datetime, timedelta, timezone
+from models import db, Venue, Artist, Show
+from seed import bulk_seed
+
+def get(client, path, **headers):
+    # streamed bodies run in the request context, so each is read at once
+    response = client.get(path, headers=headers)
+    response.get_data()
+    response.close()
+    return response
+
+def backdate():
+    # SQLite stamps updated_at to the second, so the seeded rows are moved
+    # an hour back, as if written before
+    hour_ago = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(hours=1)
+    for model in (Venue, Artist, Show):
+        db.session.execute(db.update(model).values(updated_at=hour_ago))
+    db.session.commit()
+
+def revalidate(client, path, response):
+    return get(client, path, **{'If-None-Match': response.headers['ETag']})
+
+def test_export_streams_every_row(client):
+    bulk_seed(7, 5, 20, random_seed=1)
+    response = get(client, '/api/v1/shows')
+
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    rows = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert len(rows) == 20
+    assert {'venue_name', 'artist_name', 'start_time'} <= set(rows[0])
+
+def test_unchanged_collection_revalidates(client):
+    bulk_seed(3, 3, 0, random_seed=1)
+    response = get(client, '/api/v1/venues')
+
+    assert revalidate(client, '/api/v1/venues', response).status_code == 304
+    assert get(client, '/api/v1/venues', **{
+        'If-Modified-Since': response.headers['Last-Modified']}).status_code == 304
+
+def test_writes_outside_the_app_change_the_validators(client):
+    # as written by another worker, `flask import` or `flask seed`: no cache
+    # invalidation, only the database changes
+    bulk_seed(3, 3, 10, random_seed=1)
+    backdate()
+    venues = get(client, '/api/v1/venues')
+
+    bulk_seed(1, 0, 0, random_seed=2)
+    assert revalidate(client, '/api/v1/venues', venues).status_code == 200
+    assert revalidate(client, '/api/v1/artists', get(client, '/api/v1/artists')).status_code == 304
+    backdate()
+    first = get(client, '/api/v1/shows')
+
+    venue = db.session.get(Venue, 1)
+    venue.name = 'Renamed Hall'
+    db.session.commit()
+    renamed = revalidate(client, '/api/v1/shows', first)
+    assert renamed.status_code == 200
+
+    db.session.delete(db.session.scalars(db.select(Show).limit(1)).one())
+    db.session.commit()
+    assert revalidate(client, '/api/v1/shows', renamed).status_code == 200
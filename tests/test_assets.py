@@ -0,0 +1,43 @@
+import os
+import shutil
+import time
+import pytest
+from assets import build
+
+STATIC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'static')
+
+@pytest.fixture
+def static_folder(tmp_path):
+    folder = tmp_path / 'static'
+    shutil.copytree(STATIC, folder, ignore=shutil.ignore_patterns('dist'))
+    return folder
+
+def rebuild(static_folder, script):
+    # a deploy changing js/script.js
+    (static_folder / 'js' / 'script.js').write_text(script)
+    time.sleep(0.05)
+    return build(str(static_folder))['files']
+
+def exists(static_folder, name):
+    return os.path.exists(os.path.join(static_folder, *name.split('/')))
+
+def test_previous_build_stays_served(static_folder):
+    first = rebuild(static_folder, 'var build = 1;\n')
+    second = rebuild(static_folder, 'var build = 2;\n')
+
+    assert first['js/app.js'] != second['js/app.js']
+    assert exists(static_folder, first['js/app.js'])
+    assert exists(static_folder, second['js/app.js'])
+
+def test_older_builds_are_pruned(static_folder):
+    first = rebuild(static_folder, 'var build = 1;\n')
+    second = rebuild(static_folder, 'var build = 2;\n')
+    third = rebuild(static_folder, 'var build = 3;\n')
+
+    assert not exists(static_folder, first['js/app.js'])
+    assert not exists(static_folder, first['js/app.js'] + '.gz')
+    assert exists(static_folder, second['js/app.js'])
+    assert exists(static_folder, third['js/app.js'])
+    # unchanged files are written by every build
+    assert first['css/app.css'] == third['css/app.css']
+    assert exists(static_folder, third['css/app.css'])
@@ -0,0 +1,66 @@
+import time
+import pytest
+from flask import Flask, g
+from cache import LRUCache, ResponseCache, cache_from_config
+from replicas import ReplicaRouter
+
+# A page lists the value of the database the request read, the primary or
+# the replica, which lags behind until a test replays the writes to it.
+
+STICKY_SECONDS = 0.2
+
+@pytest.fixture
+def site():
+    app = Flask(__name__)
+    app.config.update(SECRET_KEY='test', REPLICA_DATABASE_URIS=['sqlite://'], REPLICA_STICKY_SECONDS=STICKY_SECONDS)
+    router = ReplicaRouter(app)
+    cache = ResponseCache()
+    cache.backend = LRUCache(ttl=60, stamp_ttl=STICKY_SECONDS)
+    databases = {'primary': 'old', 'replica_0': 'old'}
+
+    @app.route('/page')
+    @cache.cached('page')
+    @router.replica
+    def page():
+        return databases[g.get('db_replica') or 'primary']
+
+    @app.route('/page', methods=['POST'])
+    def write():
+        databases['primary'] = 'new'
+        cache.invalidate('page')
+        return ''
+
+    app.databases = databases
+    return app
+
+def test_visitor_who_wrote_skips_the_cache(site):
+    writer = site.test_client()
+    assert writer.get('/page').text == 'old'
+
+    writer.post('/page')
+    assert writer.get('/page').text == 'new'
+    # still not cached from the primary for everyone else
+    assert site.test_client().get('/page').text == 'old'
+
+def test_lagging_replica_page_is_not_cached(site):
+    assert site.test_client().get('/page').text == 'old'
+    site.test_client().post('/page')
+
+    # the replica has not replayed the write yet: served, but not cached
+    assert site.test_client().get('/page').text == 'old'
+    site.databases['replica_0'] = 'new'
+    assert site.test_client().get('/page').text == 'new'
+
+def test_replica_pages_are_cached_again_after_the_window(site):
+    site.test_client().post('/page')
+    time.sleep(STICKY_SECONDS * 1.5)
+    site.databases['replica_0'] = 'new'
+    assert site.test_client().get('/page').text == 'new'
+
+    site.databases['replica_0'] = 'newer'
+    assert site.test_client().get('/page').text == 'new'
+
+def test_memory_cache_is_refused_with_several_workers():
+    assert isinstance(cache_from_config({'CACHE_BACKEND': 'memory', 'WEB_CONCURRENCY': 1}), LRUCache)
+    with pytest.raises(ValueError):
+        cache_from_config({'CACHE_BACKEND': 'memory', 'WEB_CONCURRENCY': 4})
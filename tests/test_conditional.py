@@ -0,0 +1,63 @@
+import json
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from assets import static_assets
+from werkzeug.http import http_date
+from models import db, Venue, Artist, Show
+from seed import bulk_seed
+
+def utc_now():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+def get(client, path, **headers):
+    return client.get(path, headers=headers)
+
+def deploy(app, builds):
+    # a manifest as written by assets.build()
+    with open(app.config['ASSETS_MANIFEST'], 'w') as stream:
+        json.dump({'files': {'css/main.css': 'dist/css/main.%d.css' % builds[-1]}, 'images': {}, 'builds': builds}, stream)
+    static_assets.load()
+
+def test_deploy_changes_the_page_validators(app, client):
+    bulk_seed(1, 1, 0, random_seed=1)
+    db.session.execute(db.update(Venue).values(updated_at=utc_now() - timedelta(days=1)))
+    db.session.commit()
+    try:
+        deploy(app, [time.time() - 3600])
+        response = get(client, '/venues/1')
+        assert get(client, '/venues/1', **{'If-None-Match': response.headers['ETag']}).status_code == 304
+
+        deploy(app, [time.time()])
+        assert get(client, '/venues/1', **{'If-None-Match': response.headers['ETag']}).status_code == 200
+        assert get(client, '/venues/1', **{
+            'If-Modified-Since': response.headers['Last-Modified']}).status_code == 200
+    finally:
+        os.remove(app.config['ASSETS_MANIFEST'])
+        static_assets.load()
+
+def test_deploy_version_changes_the_etag(app, client, monkeypatch):
+    bulk_seed(1, 1, 0, random_seed=1)
+    response = get(client, '/venues/1')
+    monkeypatch.setitem(app.config, 'DEPLOY_VERSION', 'v2')
+
+    assert get(client, '/venues/1', **{'If-None-Match': response.headers['ETag']}).status_code == 200
+
+def test_last_modified_is_utc_off_a_utc_host(app, client, monkeypatch):
+    # the last show started an hour ago, local time, after every update
+    monkeypatch.setenv('TZ', 'America/New_York')
+    time.tzset()
+    try:
+        bulk_seed(1, 1, 0, random_seed=1)
+        started = datetime.now().replace(microsecond=0) - timedelta(hours=1)
+        db.session.add(Show(venue_id=1, artist_id=1, start_time=started, duration=30))
+        db.session.commit()
+        for model in (Venue, Artist, Show):
+            db.session.execute(db.update(model).values(updated_at=utc_now() - timedelta(days=1)))
+        db.session.commit()
+
+        response = get(client, '/venues/1')
+        assert response.headers['Last-Modified'] == http_date(started.astimezone(timezone.utc))
+    finally:
+        monkeypatch.undo()
+        time.tzset()
@@ -0,0 +1,133 @@
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import quote
+import pytest
+from images import ImageCache, image_proxy
+
+# The proxy fetches from a local stand-in for the image origin, on
+# 127.0.0.1, the only host allowed; localhost stands for any other host.
+
+PNG = b'\x89PNG\r\n\x1a\n' + b'\x00' * 64
+
+class Origin(BaseHTTPRequestHandler):
+    requests = []
+
+    def do_GET(self):
+        Origin.requests.append(self.path)
+        if self.path.startswith('/image'):
+            self.reply(200, 'image/png', PNG)
+        elif self.path == '/page':
+            self.reply(200, 'text/html', b'<html></html>')
+        elif self.path.startswith('/redirect/'):
+            self.send_response(302)
+            self.send_header('Location', 'http://%s:%d/image' % (self.path[len('/redirect/'):], self.server.server_port))
+            self.end_headers()
+        else:
+            self.reply(404, 'text/plain', b'')
+
+    def reply(self, status, mimetype, body):
+        self.send_response(status)
+        self.send_header('Content-Type', mimetype)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+@pytest.fixture
+def origin():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Origin)
+    thread = threading.Thread(target=server.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True)
+    thread.start()
+    Origin.requests = []
+    yield 'http://127.0.0.1:%d' % server.server_port
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def proxy(client, tmp_path, monkeypatch):
+    monkeypatch.setattr(image_proxy, 'hosts', {'127.0.0.1'})
+    monkeypatch.setattr(image_proxy, 'cache', ImageCache(str(tmp_path / 'images'), 1024 * 1024))
+    return client
+
+def proxied(url, size='tile'):
+    return '/images/%s?url=%s' % (size, quote(url, safe=''))
+
+def test_image_is_fetched_once(proxy, origin):
+    first = proxy.get(proxied(origin + '/image'))
+    second = proxy.get(proxied(origin + '/image'))
+
+    assert first.status_code == second.status_code == 200
+    assert first.mimetype == 'image/png'
+    assert first.data == second.data == PNG
+    assert Origin.requests == ['/image']
+    assert 'public' in first.headers['Cache-Control']
+
+def test_etag_revalidates(proxy, origin):
+    response = proxy.get(proxied(origin + '/image'))
+    revalidated = proxy.get(proxied(origin + '/image'), headers={'If-None-Match': response.headers['ETag']})
+
+    assert revalidated.status_code == 304
+    assert Origin.requests == ['/image']
+
+def test_image_evicted_before_sending_is_fetched_again(proxy, origin, monkeypatch):
+    proxy.get(proxied(origin + '/image'))
+    get = image_proxy.cache.get
+
+    def evicted(key):
+        # another worker removes the file between the lookup and send_file
+        found = get(key)
+        if found is not None:
+            os.remove(found[0])
+        monkeypatch.setattr(image_proxy.cache, 'get', get)
+        return found
+
+    monkeypatch.setattr(image_proxy.cache, 'get', evicted)
+    response = proxy.get(proxied(origin + '/image'))
+
+    assert response.status_code == 200
+    assert response.data == PNG
+    assert Origin.requests == ['/image', '/image']
+
+def test_non_image_is_bad_gateway(proxy, origin):
+    assert proxy.get(proxied(origin + '/page')).status_code == 502
+    assert proxy.get(proxied(origin + '/missing')).status_code == 502
+
+def test_other_hosts_are_refused(proxy, origin):
+    other = origin.replace('127.0.0.1', 'localhost')
+    assert proxy.get(proxied(other + '/image')).status_code == 403
+    assert proxy.get(proxied('file:///etc/passwd')).status_code == 403
+    assert proxy.get(proxied(origin + '/image', size='huge')).status_code == 404
+    assert Origin.requests == []
+
+def test_redirects_to_other_hosts_are_refused(proxy, origin):
+    assert proxy.get(proxied(origin + '/redirect/localhost')).status_code == 502
+    assert Origin.requests == ['/redirect/localhost']
+
+    assert proxy.get(proxied(origin + '/redirect/127.0.0.1')).status_code == 200
+    assert Origin.requests[1:] == ['/redirect/127.0.0.1', '/image']
+
+def test_least_recently_used_images_are_evicted(tmp_path):
+    cache = ImageCache(str(tmp_path), 250)
+    for name in ('a', 'b', 'c'):
+        cache.set(name, name.encode() * 100, 'image/png')
+        time.sleep(0.02)
+    # only two fit: a went first
+    assert cache.get('a') is None
+    assert cache.get('b') is not None
+    time.sleep(0.02)
+
+    cache.set('d', b'd' * 100, 'image/png')
+    assert cache.get('c') is None
+    assert cache.get('b') is not None
+    assert cache.get('d') is not None
+
+def test_image_filter_links_allowed_hosts_only(app, monkeypatch):
+    monkeypatch.setattr(image_proxy, 'hosts', {'127.0.0.1'})
+    with app.test_request_context():
+        assert image_proxy.image_url('http://127.0.0.1/a.png', 'page') == '/images/page?url=http://127.0.0.1/a.png'
+        assert image_proxy.image_url('https://example.com/a.png') == 'https://example.com/a.png'
+        assert image_proxy.image_url(None) is None
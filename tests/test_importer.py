@@ -0,0 +1,88 @@
+import io
+from datetime import datetime, timedelta
+from sqlalchemy.exc import IntegrityError
+import importer
+from importer import import_records
+from models import db, Show, insert_show
+from seed import bulk_seed
+
+START = (datetime.now() + timedelta(days=7)).replace(hour=20, minute=0, second=0, microsecond=0)
+
+def shows_csv(*shows):
+    lines = ['venue_id,artist_id,start_time,duration']
+    lines += ['%d,%d,%s,%d' % (venue_id, artist_id, start_time.strftime('%Y-%m-%d %H:%M:%S'), duration)
+              for venue_id, artist_id, start_time, duration in shows]
+    return io.StringIO('\n'.join(lines) + '\n')
+
+def show_count():
+    return db.session.scalar(db.select(db.func.count(Show.id)))
+
+def test_overlapping_rows_of_a_file_are_rejected(client):
+    bulk_seed(3, 3, 0, random_seed=1)
+    upload = shows_csv(
+        (2, 1, START, 120),
+        (2, 2, START + timedelta(minutes=60), 120),
+        (2, 3, START + timedelta(minutes=90), 120),
+        (2, 3, START + timedelta(minutes=120), 60),
+    )
+    response = client.post('/import/shows', data={'file': (io.BytesIO(upload.getvalue().encode()), 'shows.csv')})
+
+    assert response.status_code == 200
+    result = response.get_json()
+    assert result['inserted'] == 2
+    assert [error['line'] for error in result['errors']] == [3, 4]
+    assert show_count() == 2
+
+def test_rows_overlapping_the_table_are_rejected(app):
+    bulk_seed(3, 3, 0, random_seed=1)
+    assert insert_show(db.session.connection(), 1, 1, START) == 'inserted'
+    db.session.commit()
+
+    result = import_records('shows', shows_csv(
+        (1, 2, START + timedelta(minutes=30), 60),  # venue 1 is booked
+        (2, 1, START - timedelta(minutes=60), 90),  # artist 1 is booked
+        (2, 1, START - timedelta(minutes=60), 60),  # ends as the booked show starts
+        (3, 3, START, 120),
+    ), 'csv')
+
+    assert result.inserted == 2
+    assert [line for line, errors in result.rejected] == [2, 3]
+    assert show_count() == 3
+
+def test_database_refusal_rejects_the_chunk(app, monkeypatch):
+    # a concurrent booking racing the probe: the exclusion constraints of
+    # PostgreSQL refuse the COPY
+    bulk_seed(3, 3, 0, random_seed=1)
+
+    def refuse(model, rows):
+        raise IntegrityError('COPY', {}, Exception('conflicting key value violates exclusion constraint'))
+
+    monkeypatch.setattr(importer, '_insert_rows', refuse)
+    result = import_records('shows', shows_csv((1, 1, START, 60), (2, 2, START, 60), (9, 9, START, 60)), 'csv')
+
+    assert result.inserted == 0
+    assert [line for line, errors in result.rejected] == [2, 3, 4]
+    assert 'exclusion constraint' in result.rejected[0][1]['database'][0]
+    assert show_count() == 0
+
+def test_refused_chunk_is_probed_again(app, monkeypatch):
+    bulk_seed(3, 3, 0, random_seed=1)
+    insert_rows = importer._insert_rows
+    calls = []
+
+    def race(model, rows):
+        # another worker books venue 1 just before the first COPY
+        if not calls:
+            calls.append(rows)
+            db.session.rollback()
+            insert_show(db.session.connection(), 1, 3, START)
+            db.session.commit()
+            raise IntegrityError('COPY', {}, Exception('conflicting key value violates exclusion constraint'))
+        insert_rows(model, rows)
+
+    monkeypatch.setattr(importer, '_insert_rows', race)
+    result = import_records('shows', shows_csv((1, 1, START, 60), (2, 2, START, 60)), 'csv')
+
+    assert result.inserted == 1
+    assert [line for line, errors in result.rejected] == [2]
+    assert show_count() == 2
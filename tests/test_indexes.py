@@ -0,0 +1,64 @@
+import pytest
+from datetime import datetime, timedelta
+from sqlalchemy import event
+from models import db, insert_show, overlapping_shows, rebuild_show_feed, refresh_show_counters
+from queries import venue_shows, artist_shows
+from seed import bulk_seed
+
+# The Show queries are checked against SQLite's EXPLAIN QUERY PLAN on a
+# scaled down seeded database: each must search one of the ix_show_* indexes
+# of migration 25f6b554b73b instead of scanning Show.
+
+def query_plans(function):
+    # the plan lines of every statement function runs
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(db.engine, 'before_cursor_execute', capture)
+    try:
+        function()
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', capture)
+
+    connection = db.session.connection()
+    return [row[3] for statement, parameters in statements
+            for row in connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters)]
+
+@pytest.fixture
+def seeded(app):
+    bulk_seed(50, 50, 500, random_seed=1)
+
+def test_venue_shows_search_venue_index(seeded):
+    plan = query_plans(lambda: venue_shows(3))
+    assert any('USING INDEX ix_show_venue_id_start_time' in line for line in plan)
+    assert not any(line.startswith('SCAN Show') for line in plan)
+
+def test_artist_shows_search_artist_index(seeded):
+    plan = query_plans(lambda: artist_shows(3))
+    assert any('USING INDEX ix_show_artist_id_start_time' in line for line in plan)
+    assert not any(line.startswith('SCAN Show') for line in plan)
+
+def test_show_counters_range_scan_both_indexes(seeded):
+    plan = query_plans(lambda: refresh_show_counters(db.session.connection(), [1, 2], [1, 2]))
+    assert any('ix_show_venue_id_start_time (venue_id=? AND start_time>?)' in line for line in plan)
+    assert any('ix_show_artist_id_start_time (artist_id=? AND start_time>?)' in line for line in plan)
+    assert not any(line.startswith('SCAN Show') for line in plan)
+
+def test_overlap_probe_is_bounded_range_scan(seeded):
+    start_time = datetime.now() + timedelta(days=3)
+    plan = query_plans(lambda: insert_show(db.session.connection(), 1, 1, start_time))
+    assert any('ix_show_venue_id_start_time (venue_id=? AND start_time>? AND start_time<?)' in line for line in plan)
+    assert any('ix_show_artist_id_start_time (artist_id=? AND start_time>? AND start_time<?)' in line for line in plan)
+
+def test_import_probe_is_bounded_range_scan(seeded):
+    shows = [{'venue_id': number % 50 + 1, 'artist_id': number % 40 + 1, 'duration': 60,
+              'start_time': datetime.now() + timedelta(days=number)} for number in range(20)]
+    plan = query_plans(lambda: overlapping_shows(db.session.connection(), shows))
+    assert any('ix_show_venue_id_start_time (venue_id=? AND start_time>? AND start_time<?)' in line for line in plan)
+    assert any('ix_show_artist_id_start_time (artist_id=? AND start_time>? AND start_time<?)' in line for line in plan)
+
+def test_upcoming_shows_search_start_time_index(seeded):
+    plan = query_plans(lambda: rebuild_show_feed(db.session.connection()))
+    assert any('USING INDEX ix_show_start_time_id (start_time>?)' in line for line in plan)
@@ -0,0 +1,25 @@
+import pytest
+from datetime import datetime
+from conftest import statement_count
+from seed import bulk_seed
+
+@pytest.mark.parametrize('path', ['/venues', '/artists', '/shows'])
+def test_listing_statements_do_not_grow_with_rows(client, path):
+    # N+1 guard: a listing runs as many statements with 50 venues and 200
+    # shows as with 5 venues and 20 shows
+    now = datetime.now()
+    bulk_seed(5, 5, 20, random_seed=1, now=now)
+    small = client.get(path + '?limit=100')
+    bulk_seed(45, 45, 180, random_seed=2, now=now)
+    large = client.get(path + '?limit=100')
+
+    assert small.status_code == large.status_code == 200
+    assert statement_count(large) == statement_count(small)
+    assert statement_count(large) == 1
+
+def test_venues_groups_every_venue_by_area(client):
+    bulk_seed(30, 10, 60, random_seed=1)
+    response = client.get('/venues?limit=100')
+
+    assert response.status_code == 200
+    assert response.get_data(as_text=True).count('href="/venues/') == 30
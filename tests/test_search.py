@@ -0,0 +1,53 @@
+from models import db, Venue, Artist
+from search import search, search_results
+
+def add_artist(name, city='San Francisco', state='CA', genres=('Jazz',)):
+    artist = Artist(name=name, city=city, state=state, phone='326-123-5000', genres=list(genres),
+                    facebook_link='https://www.facebook.com/artist', website='https://example.com')
+    db.session.add(artist)
+    db.session.commit()
+    return artist
+
+def names(rows):
+    return [row.name for row in rows]
+
+def test_single_letter_matches_substrings(app):
+    for name in ('Guns N Petals', 'Matt Quevedo', 'The Wild Sax Band'):
+        add_artist(name, city='Boston', state='MO', genres=['Folk'])
+    add_artist('Bob Ross', city='Boston', state='MO', genres=['Folk'])
+
+    assert sorted(names(search(Artist, 'a'))) == ['Guns N Petals', 'Matt Quevedo', 'The Wild Sax Band']
+    assert names(search(Artist, 'A')) == names(search(Artist, 'a'))
+
+def test_words_match_inside_names(app):
+    add_artist('The Musical Hop')
+    add_artist('Park Square Live Music & Coffee')
+
+    assert names(search(Artist, 'Hop')) == ['The Musical Hop']
+    assert sorted(names(search(Artist, 'Music'))) == ['Park Square Live Music & Coffee', 'The Musical Hop']
+    assert names(search(Artist, 'usica')) == ['The Musical Hop']
+    assert names(search(Artist, 'music coffee')) == ['Park Square Live Music & Coffee']
+
+def test_name_matches_rank_before_other_columns(app):
+    add_artist('Blues Brothers', city='Austin', state='TX', genres=['Blues'])
+    add_artist('Austin Trio', city='Seattle', state='WA', genres=['Folk'])
+
+    assert names(search(Artist, 'austin')) == ['Austin Trio', 'Blues Brothers']
+    assert names(search(Artist, 'folk')) == ['Austin Trio']
+
+def test_renamed_rows_are_found(app):
+    artist = add_artist('Quiet Owl')
+    artist.name = 'Loud Comet'
+    db.session.commit()
+
+    assert names(search(Artist, 'owl')) == []
+    assert names(search(Artist, 'comet')) == ['Loud Comet']
+
+def test_count_covers_every_match(app):
+    for number in range(12):
+        add_artist('Band %d' % number)
+
+    results = search_results(Artist, 'band', limit=5)
+    assert results['count'] == 12
+    assert len(results['data']) == 5
+    assert search_results(Venue, 'band')['count'] == 0
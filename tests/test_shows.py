@@ -0,0 +1,66 @@
+import sqlite3
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy.exc import IntegrityError
+import app as views
+from models import db, Show
+from seed import bulk_seed
+
+START = (datetime.now() + timedelta(days=7)).replace(hour=20, minute=0, second=0, microsecond=0)
+
+def create_show(client, venue_id, artist_id, start_time=START, duration=90):
+    return client.post('/shows/create', data={
+        'venue_id': venue_id,
+        'artist_id': artist_id,
+        'start_time': start_time.strftime('%Y-%m-%d %H:%M:%S'),
+        'duration': duration,
+    })
+
+def shows():
+    return db.session.execute(db.select(Show.venue_id, Show.artist_id, Show.start_time)).all()
+
+def refusing(orig):
+    def insert_show(connection, *args):
+        raise IntegrityError('INSERT', {}, orig)
+    return insert_show
+
+def test_show_is_created(client):
+    bulk_seed(2, 2, 0, random_seed=1)
+    response = create_show(client, 1, 2)
+
+    assert response.status_code == 302
+    assert shows() == [(1, 2, START)]
+
+def test_unknown_venue_is_not_found(client):
+    bulk_seed(2, 2, 0, random_seed=1)
+
+    assert create_show(client, 9, 1).status_code == 404
+    assert shows() == []
+
+def test_overlapping_show_is_a_conflict(client):
+    bulk_seed(2, 2, 0, random_seed=1)
+    assert create_show(client, 1, 1).status_code == 302
+
+    assert create_show(client, 1, 2, START + timedelta(minutes=60)).status_code == 409
+    assert create_show(client, 2, 1, START - timedelta(minutes=60)).status_code == 409
+    assert shows() == [(1, 1, START)]
+
+def test_submitted_duration_is_stored(client):
+    bulk_seed(2, 2, 0, random_seed=1)
+    assert create_show(client, 1, 1, duration=45).status_code == 302
+
+    assert db.session.scalar(db.select(Show.duration)) == 45
+    # the show ends after 45 minutes, so the next one may start then
+    assert create_show(client, 1, 2, START + timedelta(minutes=45)).status_code == 302
+
+@pytest.mark.parametrize('orig, status_code', [
+    # a concurrent booking
+    (Exception('conflicting key value violates exclusion constraint "ex_show_venue_period"'), 409),
+    # the venue or artist deleted between the probe and the insert
+    (sqlite3.IntegrityError('FOREIGN KEY constraint failed'), 404),
+])
+def test_database_refusal(client, monkeypatch, orig, status_code):
+    bulk_seed(2, 2, 0, random_seed=1)
+    monkeypatch.setattr(views, 'insert_show', refusing(orig))
+
+    assert create_show(client, 1, 1).status_code == status_code